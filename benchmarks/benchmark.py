@@ -0,0 +1,135 @@
+'''Benchmarks of hot paths of the exchange simulator on synthetic data.
+
+It imports the package from this source checkout, so it runs without
+installing it, for example from the repository root:
+
+    python benchmarks/benchmark.py --candles 100000 --currencies 10 50
+
+For every number of currencies it prints throughput of each benchmark and a
+peak memory allocated while it was running.
+'''
+
+import argparse
+import sys
+import tempfile
+import time
+import tracemalloc
+from os import path
+import numpy as np
+
+# The package is imported from the source checkout, so it doesn't need to be
+# installed.
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+from xchg import Xchg  # noqa: E402
+from xchg.common import _read_candles  # noqa: E402
+from xchg.synthetic import synthetic_candles  # noqa: E402
+from xchg.synthetic import write_synthetic_csv  # noqa: E402
+
+
+def measure(function, *args) -> tuple:
+    '''Run a function and measure its time and peak memory. Memory tracing
+    slows down allocations, so the function is run twice: first for time and
+    then for memory.
+
+    Args:
+        function: A function which returns a number of operations it made.
+        args: Arguments of the function.
+
+    Returns:
+        A number of operations per second and a peak memory in megabytes.
+    '''
+    start = time.perf_counter()
+    operations = function(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return operations / elapsed, peak / 2 ** 20
+
+
+def read_csv(data_path: str) -> int:
+    '''Parse csv files without a cache.'''
+    return len(_read_candles(data_path, cache=False))
+
+
+def read_cache(data_path: str) -> int:
+    '''Load candles from a binary cache.'''
+    return len(_read_candles(data_path))
+
+
+def next_step(x: Xchg) -> int:
+    '''Go through all candles.'''
+    steps = 0
+    while len(x) > 1:
+        x = x.next_step()
+        steps += 1
+    return steps
+
+
+def buy_sell(x: Xchg, trades: int) -> int:
+    '''Buy and sell the first currency.'''
+    currency = x.currencies[0]
+    amount = x.capital / 10 / x.current_candle[currency]['close']
+    for _ in range(trades // 2):
+        x = x.buy(currency, amount).sell(currency, amount / 2)
+    return trades // 2 * 2
+
+
+def make_portfolio(x: Xchg, weights: np.ndarray) -> int:
+    '''Make a portfolio at every step.'''
+    columns = ['cash'] + x.currencies
+    for row in weights:
+        x = x.make_portfolio(dict(zip(columns, row)))
+        if len(x) > 1:
+            x = x.next_step()
+    return len(weights)
+
+
+def backtest(x: Xchg, weights: np.ndarray) -> int:
+    '''Make a portfolio at every step with a vectorized backtest.'''
+    x.backtest(weights)
+    return len(weights)
+
+
+def main():
+    '''Run benchmarks and print results.'''
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--candles', type=int, default=10000)
+    parser.add_argument('--currencies', type=int, nargs='+',
+                        default=[10, 100])
+    parser.add_argument('--rebalances', type=int, default=1000)
+    parser.add_argument('--trades', type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'benchmark':<16}{'currencies':>12}{'ops/sec':>16}{'peak MB':>12}")
+    for currencies in args.currencies:
+        rng = np.random.default_rng(0)
+        weights = rng.dirichlet(np.ones(currencies + 1),
+                                min(args.rebalances, args.candles))
+        equal = np.full((args.candles, currencies + 1), 1 / (currencies + 1))
+        x = Xchg(0.002, 0.0001, candles=synthetic_candles(
+            args.candles, currencies, seed=0))
+        with tempfile.TemporaryDirectory() as data_path:
+            write_synthetic_csv(data_path, args.candles, currencies, seed=0)
+            # Build the cache, so read_cache measures warm loads.
+            read_cache(data_path)
+            results = {
+                'read_csv': measure(read_csv, data_path),
+                'read_cache': measure(read_cache, data_path),
+                'next_step': measure(next_step, x),
+                'buy_sell': measure(buy_sell, x, args.trades),
+                'make_portfolio': measure(make_portfolio, x, weights),
+                'backtest': measure(backtest, x, weights),
+                # Small orders of a fixed portfolio are rejected at most
+                # steps.
+                'backtest_equal': measure(backtest, x, equal),
+            }
+        for name, (speed, peak) in results.items():
+            print(f"{name:<16}{currencies:>12}{speed:>16.1f}{peak:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
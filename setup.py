@@ -34,20 +34,22 @@ setup(
     url=f"https://github.com/sergei-bondarenko/{PACKAGE_NAME}",
     license='Unlicense',
     packages=[PACKAGE_NAME],
+    python_requires='>=3.8',
     install_requires=[
-        'pandas',
         'poloniex',
-        'numpy'
+        'numpy',
+        'requests'
     ],
     entry_points={
         'console_scripts':
-            [f"download_candles={PACKAGE_NAME}.download_candles:_main"],
+            [f"download_candles={PACKAGE_NAME}.download_candles:_main",
+             f"xchg_server={PACKAGE_NAME}.server:_main"],
     },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
     ],
 )
@@ -1,4 +1,10 @@
+from .candles import Candles
+from .ledger import Ledger
+from .stream import CandleStream
+from .vec import VecXchg
+from .xchg import MutableXchg
 from .xchg import Xchg
 
-__version__ = '6.0.1'
-__all__ = ['Xchg']
+__version__ = '6.24.0'
+__all__ = ['Candles', 'CandleStream', 'Ledger', 'MutableXchg', 'VecXchg',
+           'Xchg']
@@ -0,0 +1,243 @@
+'''Columnar storage of candles.'''
+
+import numpy as np
+from .features import Features
+
+# How values of columns are aggregated into coarser candles. Columns which are
+# not listed take the last value.
+_ROLLUPS = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
+            'volume': 'sum', 'quoteVolume': 'sum'}
+
+
+class Candles:
+    def __init__(self, currencies: list, columns: list, data: dict,
+                 missing: np.ndarray = None):
+        '''Create a columnar candles store.
+
+        Args:
+            currencies: A sorted list of currencies.
+            columns: A list of columns, for example ['date', 'close'].
+            data: A dictionary where keys are columns and values are arrays
+                with a shape (T, N), where T is a number of candles and N is a
+                number of currencies.
+            missing: A boolean array with a shape (T, N) which flags candles
+                that were missing in the data and were filled, or None if
+                there are no such candles.
+        '''
+        self.__currencies = list(currencies)
+        self.__columns = list(columns)
+        self.__data = {column: np.asanyarray(data[column])
+                       for column in columns}
+        self.__index = {currency: i for i, currency
+                        in enumerate(self.__currencies)}
+        self.__missing = None if missing is None \
+            else np.asanyarray(missing, dtype=bool)
+        self.__rollups = {}
+        self.__features = None
+        self.__dates = None
+
+    @classmethod
+    def from_list(cls, candles: list) -> 'Candles':
+        '''Convert a list of candles into a columnar store.
+
+        Args:
+            candles: A list of candles, each candle is a dictionary where keys
+                are currencies and values are dictionaries of columns.
+
+        Returns:
+            A Candles instance.
+        '''
+        currencies = sorted(candles[0].keys())
+        columns = list(candles[0][currencies[0]].keys())
+        data = {}
+        for column in columns:
+            data[column] = np.array([[float(candle[currency][column])
+                                      for currency in currencies]
+                                     for candle in candles], dtype=np.float64)
+        return cls(currencies, columns, data)
+
+    def __len__(self):
+        '''Returns the number of candles.'''
+        return len(self.__data[self.__columns[0]])
+
+    @property
+    def currencies(self) -> list:
+        '''Get currencies which are stored.
+
+        Returns:
+            A sorted list of currencies.
+        '''
+        return self.__currencies
+
+    @property
+    def columns(self) -> list:
+        '''Get columns which are stored.
+
+        Returns:
+            A list of columns.
+        '''
+        return self.__columns
+
+    @property
+    def features(self) -> Features:
+        '''Get a cache of indicators computed over these candles, for
+        example candles.features('sma', window=20).
+
+        Returns:
+            A Features instance.
+        '''
+        if self.__features is None:
+            self.__features = Features(self)
+        return self.__features
+
+    def index(self, currency: str) -> int:
+        '''Get a position of the currency in the arrays.
+
+        Args:
+            currency: A name of the currency.
+
+        Returns:
+            An index along the second axis of column arrays.
+        '''
+        return self.__index[currency]
+
+    def column(self, column: str) -> np.ndarray:
+        '''Get all values of a column.
+
+        Args:
+            column: A name of the column.
+
+        Returns:
+            An array with a shape (T, N).
+        '''
+        return self.__data[column]
+
+    def row(self, column: str, position: int) -> np.ndarray:
+        '''Get values of a column for all currencies at the given position.
+
+        Args:
+            column: A name of the column.
+            position: An index of the candle.
+
+        Returns:
+            An array with a shape (N,).
+        '''
+        return self.__data[column][position]
+
+    def missing(self, position: int) -> np.ndarray:
+        '''Get which candles at the given position were missing in the data.
+
+        Args:
+            position: An index of the candle, or indexes of several candles.
+
+        Returns:
+            A boolean array with a shape (N,), or with one more leading axis
+            for several candles if there are missing candles.
+        '''
+        if self.__missing is None:
+            return np.zeros(len(self.__currencies), dtype=bool)
+        return self.__missing[position]
+
+    def date(self, position: int) -> float:
+        '''Get a date of the candle at the given position.
+
+        Args:
+            position: An index of the candle.
+
+        Returns:
+            A date of the first currency.
+        '''
+        return self.__data['date'][position, 0].item()
+
+    def search(self, timestamp: float, start: int = 0, end: int = None,
+               side: str = 'left') -> int:
+        '''Find a position of a date with a binary search over a sorted
+        index of dates, which is built on the first call.
+
+        Args:
+            timestamp: A date (UNIX timestamp).
+            start: The first position to search.
+            end: The position after the last one to search, the number of
+                candles by default.
+            side: 'left' to find the first candle at or after the date, or
+                'right' to find the first candle after it.
+
+        Returns:
+            An index of the candle, or end if there is no such candle.
+        '''
+        if self.__dates is None:
+            self.__dates = np.ascontiguousarray(self.__data['date'][:, 0])
+        end = len(self) if end is None else end
+        return start + int(np.searchsorted(self.__dates[start:end], timestamp,
+                                           side))
+
+    def candle(self, position: int) -> dict:
+        '''Build a candle at the given position as a dictionary.
+
+        Args:
+            position: An index of the candle.
+
+        Returns:
+            A dictionary where keys are currencies and values are
+            dictionaries of columns.
+        '''
+        rows = [self.__data[column][position].tolist()
+                for column in self.__columns]
+        return {currency: {column: rows[j][i] for j, column
+                           in enumerate(self.__columns)}
+                for i, currency in enumerate(self.__currencies)}
+
+    def rollup(self, period: int) -> 'Candles':
+        '''Get candles aggregated over a longer period, for example 4 hours
+        from 30 minutes. A coarse candle starts at a date which is a multiple
+        of the period, and its open, high, low, close and volumes are
+        aggregated from the candles which fall into it. Rollups are built in
+        one pass over the arrays and cached, so the next call with the same
+        period is free.
+
+        Args:
+            period: Period for one coarse candle in seconds.
+
+        Returns:
+            A Candles instance.
+        '''
+        if period not in self.__rollups:
+            buckets = self.__data['date'][:, 0] // period
+            starts = np.flatnonzero(np.diff(buckets, prepend=np.nan))
+            ends = np.append(starts[1:], len(self)) - 1
+            data = {}
+            for column in self.__columns:
+                values = self.__data[column]
+                how = _ROLLUPS.get(column, 'last')
+                if column == 'date':
+                    data[column] = np.repeat(buckets[starts, None] * period,
+                                             values.shape[1], axis=1)
+                elif how == 'first':
+                    # The first known value, a currency may have its first
+                    # candle inside the period.
+                    last = np.repeat(ends, ends - starts + 1)
+                    rows = np.where(np.isnan(values), last[:, None],
+                                    np.arange(len(values))[:, None])
+                    data[column] = np.take_along_axis(
+                        values, np.minimum.reduceat(rows, starts), axis=0)
+                elif how == 'max':
+                    data[column] = np.fmax.reduceat(values, starts)
+                elif how == 'min':
+                    data[column] = np.fmin.reduceat(values, starts)
+                elif how == 'sum':
+                    data[column] = np.add.reduceat(values, starts)
+                else:
+                    data[column] = values[ends]
+            if {'weightedAverage', 'volume', 'quoteVolume'} \
+                    <= set(self.__columns):
+                # A price weighted by volumes of the whole period.
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    average = data['volume'] / data['quoteVolume']
+                data['weightedAverage'] = np.where(
+                    data['quoteVolume'] > 0, average, data['weightedAverage'])
+            # A coarse candle is missing if all its candles are missing.
+            missing = None if self.__missing is None \
+                else np.logical_and.reduceat(self.__missing, starts)
+            self.__rollups[period] = Candles(self.__currencies,
+                                             self.__columns, data, missing)
+        return self.__rollups[period]
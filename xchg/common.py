@@ -1,48 +1,421 @@
 '''Common functions used by several sub-modules. It's for internal use only.'''
 
 import csv
+import json
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from os import path
 from os import listdir
+from time import perf_counter
+from . import instrumentation
+from .candles import Candles
 
+# A directory inside a data path where parsed candles are cached.
+_CACHE_DIR = '.xchg_cache'
 
-def _read_candles(data_path: str) -> list:
+# A version of the cache format, caches of other versions are rebuilt.
+_CACHE_VERSION = 2
+
+# A total size of csv files in bytes from which they are parsed in parallel.
+_PARALLEL_SIZE = 1 << 22
+
+# Columns of a missing candle which are set to the previous close price, and
+# columns which are set to zero. Other columns keep previous values.
+_PRICE_COLUMNS = ('open', 'high', 'low', 'weightedAverage')
+_VOLUME_COLUMNS = ('volume', 'quoteVolume')
+
+
+def _read_candles(data_path: str, cache: bool = True, processes: int = None,
+                  columns: list = None, dtype=np.float64) -> Candles:
     '''Read all csv files with candles inside the directory.
 
+    Parsed candles are saved to a binary cache in the same directory, and
+    later loads memory-map it instead of parsing csv files again. The cache is
+    rebuilt when size or modification time of any csv file changes. Each
+    column is cached separately for each dtype, so loads which need more
+    columns only parse the missing ones.
+
+    Files may have different dates, for example with gaps or a currency
+    which appeared later. Then candles are aligned on the union of all dates:
+    a missing candle repeats the previous close price with zero volumes, or
+    has NaN prices if the currency has no candles yet, and it's flagged in
+    Candles.missing.
+
     Args:
         data_path: Where csv files with data are stored.
+        cache: Whether to use the binary cache.
+        processes: A number of processes which parse csv files, the number of
+            CPUs by default.
+        columns: Columns to load, all columns by default. The date and close
+            columns are always loaded, other columns are skipped while
+            parsing.
+        dtype: A data type of loaded values, for example np.float32. Dates
+            are always float64.
 
     Returns:
-        A dictionary containing a list of currencies and a list candles.
+        A columnar store of candles.
     '''
-    candles = []
-    csv_files = {}
-    filenames = sorted(listdir(data_path))
-    currencies = []
+    timed = instrumentation.enabled
+    if timed:
+        start = perf_counter()
+    filenames = sorted(f for f in listdir(data_path)
+                       if path.splitext(f)[1] == '.csv')
+    currencies = [path.splitext(filename)[0] for filename in filenames]
+    header = _read_header(path.join(data_path, filenames[0]))
+    columns = _select_columns(header, columns)
+    dtypes = {column: np.dtype(np.float64 if column == 'date' else dtype)
+              for column in columns}
+
+    data = {}
+    missing = None
+    if cache:
+        signature = _signature(data_path, filenames)
+        meta = _load_meta(data_path, signature)
+        data, missing = _load_cache(data_path, meta, dtypes)
+    cached = len(data) == len(columns)
+    if not cached:
+        parsed, missing = _parse_candles(
+            data_path, filenames, processes, header,
+            {column: dtype for column, dtype in dtypes.items()
+             if column not in data})
+        if cache:
+            _save_cache(data_path, signature, meta, header, parsed, missing)
+        data.update(parsed)
+    candles = Candles(currencies, columns, data, missing)
+    if timed:
+        instrumentation._time('load', perf_counter() - start,
+                              data_path=str(data_path), cached=cached)
+    return candles
+
+
+def _read_header(filepath: str) -> list:
+    '''Read columns of a csv file.
+
+    Args:
+        filepath: Path to a csv file.
+
+    Returns:
+        A list of columns.
+    '''
+    with open(filepath, newline='') as csvfile:
+        return next(csv.reader(csvfile))
+
+
+def _select_columns(header: list, columns: list = None) -> list:
+    '''Select columns to load.
+
+    Args:
+        header: Columns of csv files.
+        columns: Requested columns or None for all of them.
+
+    Returns:
+        Requested columns with date and close in the order of the header.
+    '''
+    if columns is None:
+        return list(header)
+    unknown = set(columns) - set(header)
+    if unknown:
+        raise ValueError(f"There are no columns {sorted(unknown)} in csv "
+                         f"files.")
+    keep = set(columns) | {'date', 'close'}
+    return [column for column in header if column in keep]
+
+
+def _parse_candles(data_path: str, filenames: list, processes: int,
+                   header: list, dtypes: dict) -> tuple:
+    '''Parse csv files with candles and align them by dates. Large datasets
+    are parsed by a pool of processes, one file per task.
+
+    Args:
+        data_path: Where csv files with data are stored.
+        filenames: Sorted names of csv files.
+        processes: A number of processes, the number of CPUs if it's None.
+        header: Columns of csv files.
+        dtypes: A dictionary where keys are columns to parse and values are
+            their data types.
+
+    Returns:
+        A dictionary where keys are columns and values are arrays with a shape
+        (T, N), and a boolean array of missing candles with the same shape or
+        None if files have the same dates.
+    '''
+    # Dates and close prices are needed to align files.
+    columns = [column for column in ('date', 'close')
+               if column in header and column not in dtypes] + list(dtypes)
+    filepaths = [path.join(data_path, filename) for filename in filenames]
+    size = sum(os.path.getsize(filepath) for filepath in filepaths)
+    processes = os.cpu_count() if processes is None else processes
+    if processes > 1 and len(filepaths) > 1 and size >= _PARALLEL_SIZE:
+        with ProcessPoolExecutor(processes) as executor:
+            parsed = list(executor.map(_parse_file, filepaths,
+                                       [columns] * len(filepaths)))
+    else:
+        parsed = [_parse_file(filepath, columns) for filepath in filepaths]
+
+    dates = [values[:, columns.index('date')] if 'date' in columns
+             else np.arange(len(values), dtype=np.float64)
+             for values in parsed]
+    if all(np.array_equal(d, dates[0]) for d in dates):
+        timeline = dates[0]
+        rows = [slice(None)] * len(parsed)
+        missing = None
+    else:
+        timeline = _merge_dates(dates)
+        rows, missing = _align(timeline, dates)
+
+    data = {column: np.empty((len(timeline), len(filenames)),
+                             dtype=dtypes.get(column, np.float64))
+            for column in columns}
+    for i, values in enumerate(parsed):
+        for j, column in enumerate(columns):
+            data[column][:, i] = values[rows[i], j]
+    if missing is not None:
+        # A currency has no prices before its first candle.
+        leading = np.logical_and.accumulate(missing, axis=0)
+        for column in columns:
+            if column != 'date':
+                data[column][leading] = np.nan
+        _fill_missing(data, missing, timeline[:, None])
+    return {column: data[column] for column in dtypes}, missing
+
+
+def _merge_dates(dates: list) -> np.ndarray:
+    '''Merge sorted dates of all files into one timeline. Files are already
+    in memory, so it's a sort of their concatenation.
+
+    Args:
+        dates: Sorted arrays of dates, one for each file.
+
+    Returns:
+        A sorted array of unique dates.
+    '''
+    return np.unique(np.concatenate(dates))
+
+
+def _align(timeline: np.ndarray, dates: list) -> tuple:
+    '''Find which rows of files fill each date of the timeline.
+
+    Args:
+        timeline: A sorted array of unique dates.
+        dates: Sorted arrays of dates, one for each file.
+
+    Returns:
+        A list of arrays with indexes of rows of each file for each date,
+        where a missing date takes the previous row or the first one before
+        the first candle of the file, and a boolean array of missing candles
+        with a shape (T, N).
+    '''
+    rows = []
+    missing = np.ones((len(timeline), len(dates)), dtype=bool)
+    for i, file_dates in enumerate(dates):
+        missing[np.searchsorted(timeline, file_dates), i] = False
+        rows.append(np.maximum(np.cumsum(~missing[:, i]) - 1, 0))
+    return rows, missing
+
+
+def _fill_missing(data: dict, missing: np.ndarray, dates) -> None:
+    '''Change values of missing candles, which are copies of other candles,
+    in place. Prices are set to the close price, volumes to zero and dates to
+    the dates of the timeline.
+
+    Args:
+        data: A dictionary where keys are columns and values are arrays with
+            the shape of missing.
+        missing: A boolean array of missing candles.
+        dates: Dates of the timeline which can be broadcast to the shape of
+            missing.
+    '''
+    if 'date' in data:
+        data['date'][missing] = np.broadcast_to(dates, missing.shape)[missing]
+    for column in _PRICE_COLUMNS:
+        if column in data and 'close' in data:
+            data[column][missing] = data['close'][missing]
+    for column in _VOLUME_COLUMNS:
+        if column in data:
+            data[column][missing] = 0.0
 
-    for filename in filenames:
-        currency = path.splitext(filename)[0]
-        currencies.append(currency)
-        csv_files[currency] = _read_csv(path.join(data_path, filename))
 
-    candles_number = len(csv_files[currency])
+def _parse_file(filepath: str, columns: list) -> np.ndarray:
+    '''Parse columns of a csv file straight into an array. Files which
+    numpy can't parse, for example with quoted values, are read with the csv
+    module.
+
+    Args:
+        filepath: Path to a csv file.
+        columns: Columns to parse.
 
-    for i in range(candles_number):
-        candles.append({})
-        for currency in currencies:
-            candles[i][currency] = {k: float(v) for k, v
-                                    in dict(csv_files[currency][i]).items()}
-    return {'currencies': sorted(currencies), 'candles': candles}
+    Returns:
+        An array of values with a shape (T, C), where C is the number of
+        columns.
+    '''
+    with open(filepath, newline='') as csvfile:
+        header = next(csv.reader(csvfile))
+        usecols = [header.index(column) for column in columns]
+        try:
+            return np.loadtxt(csvfile, delimiter=',', dtype=np.float64,
+                              usecols=usecols, ndmin=2)
+        except ValueError:
+            pass
+    # Only parsed columns are converted, and blank lines are skipped.
+    rows = _read_csv(filepath)['rows']
+    return np.array([[row[i] for i in usecols] for row in rows if row],
+                    dtype=np.float64).reshape(-1, len(usecols))
 
 
-def _read_csv(filepath: str) -> list:
+def _read_csv(filepath: str) -> dict:
     '''Read csv file into list of rows.
 
     Args:
       filepath: Path to a csv file with data is stored.
 
     Returns:
-        A list of rows.
+        A dictionary with a list of columns and a list of rows.
     '''
     with open(filepath, newline='') as csvfile:
-        result = list(csv.DictReader(csvfile))
-    return result
+        reader = csv.reader(csvfile)
+        columns = next(reader)
+        rows = list(reader)
+    return {'columns': columns, 'rows': rows}
+
+
+def _signature(data_path: str, filenames: list) -> dict:
+    '''Get sizes and modification times of csv files.
+
+    Args:
+        data_path: Where csv files with data are stored.
+        filenames: Names of csv files.
+
+    Returns:
+        A dictionary where keys are filenames and values are lists with a size
+        and a modification time in nanoseconds.
+    '''
+    signature = {}
+    for filename in filenames:
+        stat = os.stat(path.join(data_path, filename))
+        signature[filename] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def _load_meta(data_path: str, signature: dict) -> dict:
+    '''Read metadata of the cache if the cache is up to date.
+
+    Args:
+        data_path: Where csv files with data are stored.
+        signature: Sizes and modification times of csv files.
+
+    Returns:
+        A dictionary with the signature and cached arrays, or None if there
+        is no valid cache.
+    '''
+    try:
+        with open(path.join(data_path, _CACHE_DIR, 'meta.json')) as f:
+            meta = json.load(f)
+        if (meta.get('version') != _CACHE_VERSION
+                or meta['files'] != signature
+                or not isinstance(meta['arrays'], dict)):
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return meta
+
+
+def _cache_file(header: list, column: str, dtype: np.dtype) -> str:
+    '''Get a name of the cache file of a column. It depends only on the
+    column and the dtype, so concurrent loads never write different arrays
+    into one file.
+
+    Args:
+        header: Columns of csv files.
+        column: A name of the column.
+        dtype: A data type of the array.
+
+    Returns:
+        A filename.
+    '''
+    return f"{header.index(column)}.{np.dtype(dtype).name}.npy"
+
+
+def _load_cache(data_path: str, meta: dict, dtypes: dict) -> tuple:
+    '''Memory-map cached columns.
+
+    Args:
+        data_path: Where csv files with data are stored.
+        meta: Metadata of the cache or None.
+        dtypes: A dictionary where keys are requested columns and values are
+            their data types.
+
+    Returns:
+        A dictionary where keys are columns which are found in the cache and
+        values are arrays, and cached flags of missing candles or None.
+    '''
+    data = {}
+    missing = None
+    if meta is None:
+        return data, missing
+    keys = {f"{column}:{dtype.name}": column
+            for column, dtype in dtypes.items()}
+    for key, filename in meta['arrays'].items():
+        try:
+            if key in keys:
+                data[keys[key]] = np.load(
+                    path.join(data_path, _CACHE_DIR, filename),
+                    mmap_mode='r')
+            elif key == 'missing':
+                missing = np.load(path.join(data_path, _CACHE_DIR,
+                                            filename), mmap_mode='r')
+        except (OSError, ValueError):
+            pass
+    return data, missing
+
+
+def _save_cache(data_path: str, signature: dict, meta: dict, header: list,
+                data: dict, missing: np.ndarray = None) -> None:
+    '''Add parsed columns to the cache. Errors are ignored, for example when
+    the directory is read-only.
+
+    Args:
+        data_path: Where csv files with data are stored.
+        signature: Sizes and modification times of csv files.
+        meta: Metadata of the cache or None if it's not valid.
+        header: Columns of csv files.
+        data: A dictionary where keys are columns and values are arrays.
+        missing: Flags of missing candles or None.
+    '''
+    cache_path = path.join(data_path, _CACHE_DIR)
+    try:
+        os.makedirs(cache_path, exist_ok=True)
+        if meta is None:
+            meta = {'version': _CACHE_VERSION, 'files': signature,
+                    'arrays': {}}
+            # Metadata is removed first and written last, so an interrupted
+            # write is never used.
+            if path.exists(path.join(cache_path, 'meta.json')):
+                os.remove(path.join(cache_path, 'meta.json'))
+        for column, values in data.items():
+            filename = _cache_file(header, column, values.dtype)
+            _replace_file(path.join(cache_path, filename),
+                          lambda f: np.save(f, values))
+            meta['arrays'][f"{column}:{values.dtype.name}"] = filename
+        if missing is not None:
+            _replace_file(path.join(cache_path, 'missing.npy'),
+                          lambda f: np.save(f, missing))
+            meta['arrays']['missing'] = 'missing.npy'
+        _replace_file(path.join(cache_path, 'meta.json'),
+                      lambda f: f.write(json.dumps(meta).encode()))
+    except OSError:
+        pass
+
+
+def _replace_file(filepath: str, write) -> None:
+    '''Write a file to a temporary location and then move it in place, so
+    processes which have the old file memory-mapped are not affected.
+
+    Args:
+        filepath: Path to the file.
+        write: A function which writes content to a binary file object.
+    '''
+    tmp_path = f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, filepath)
@@ -5,12 +5,42 @@ After package installation just run "download_candles" script in your
 CLI without any parameters in order to download sample data.
 '''
 
+import csv
 import os
-import pandas as pd
+import requests
+from concurrent.futures import ThreadPoolExecutor
 from poloniex import Poloniex
 
+# Public API of Poloniex.
+PUBLIC_URL = 'https://poloniex.com/public'
 
-def _request(currency: str, period: int, start: int, end: int) -> list:
+# Columns of saved csv files.
+COLUMNS = ['date', 'high', 'low', 'open', 'close', 'volume', 'quoteVolume',
+           'weightedAverage']
+
+
+def _client(url: str = PUBLIC_URL, rate_limit: int = 6,
+            connections: int = 10) -> Poloniex:
+    '''Create a Poloniex client which can be shared between threads.
+
+    Args:
+        url: An address of the public API.
+        rate_limit: Maximum number of requests per second.
+        connections: How many connections are kept open for reuse.
+
+    Returns:
+        A Poloniex client.
+    '''
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=connections,
+                                            pool_maxsize=connections)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return Poloniex(public_url=url, limit=rate_limit, session=session)
+
+
+def _request(currency: str, period: int, start: int, end: int,
+             client: Poloniex = None) -> list:
     '''Get candles data from Poloniex exchange for a specified currency
     relative to BTC.
 
@@ -19,37 +49,129 @@ def _request(currency: str, period: int, start: int, end: int) -> list:
         period: Period for one candle in seconds.
         start: Start of the range (UNIX timestamp).
         end: End of the range (UNIX timestamp).
+        client: A Poloniex client, a new one is created if it's None.
 
     Returns:
         A list of dictionaries, each of each represents one candle.
     '''
-    polo = Poloniex()
+    polo = client or Poloniex()
     pair = f"BTC_{currency}"
     return polo.returnChartData(pair, period, start=start, end=end)
 
 
-def _candles_to_df(candles: list) -> pd.core.frame.DataFrame:
-    '''Converts list of candles to a Pandas DataFrame.
+def _chunks(start: int, end: int, period: int, chunk_size: int) -> list:
+    '''Split a range into chunks which do not overlap.
 
     Args:
-        candles: List of candles.
+        start: Start of the range (UNIX timestamp).
+        end: End of the range (UNIX timestamp).
+        period: Period for one candle in seconds.
+        chunk_size: Maximum number of candles in one chunk.
 
-    Returns Pandas DataFrame filled with candles.
+    Returns:
+        A list of tuples with a start and an end of each chunk.
     '''
-    return pd.DataFrame(candles, columns=[
-            'date', 'high', 'low', 'open', 'close',
-            'volume', 'quoteVolume', 'weightedAverage'
-        ])
+    step = period * chunk_size
+    return [(first, min(first + step - 1, end))
+            for first in range(start, end + 1, step)]
+
+
+def _download(ranges: dict, period: int, fetch=None, workers: int = 8,
+              chunk_size: int = 5000, rate_limit: int = 6):
+    '''Download candles for several currencies concurrently, splitting long
+    ranges into chunks.
+
+    Args:
+        ranges: A dictionary where keys are currencies and values are tuples
+            with a start and an end of the range to request (UNIX
+            timestamps).
+        period: Period for one candle in seconds.
+        fetch: A function with the same arguments as _request without a
+            client, which returns a list of candles. By default candles are
+            requested from Poloniex through one shared client.
+        workers: How many requests are made at the same time.
+        chunk_size: Maximum number of candles in one request.
+        rate_limit: Maximum number of requests per second for the default
+            fetch function.
+
+    Yields:
+        Tuples with a currency and a list of candles of one chunk. Chunks of
+        each currency are yielded in the order of dates.
+    '''
+    if fetch is None:
+        client = _client(rate_limit=rate_limit, connections=workers)
+
+        def fetch(currency, period, start, end):
+            return _request(currency, period, start, end, client)
+
+    with ThreadPoolExecutor(workers) as executor:
+        futures = {currency: [(chunk[0], executor.submit(fetch, currency,
+                                                         period, *chunk))
+                              for chunk in _chunks(start, end, period,
+                                                   chunk_size)]
+                   for currency, (start, end) in ranges.items()}
+        try:
+            for currency, chunks in futures.items():
+                for start, future in chunks:
+                    # Poloniex returns a candle with a zero date when there is
+                    # no data in the range.
+                    yield currency, [candle for candle in future.result()
+                                     if candle['date'] >= start]
+        finally:
+            for chunks in futures.values():
+                for _, future in chunks:
+                    future.cancel()
+
+
+def _last_date(filepath: str) -> int:
+    '''Get a date of the last candle in a csv file. A partially written last
+    line, which is left by an interrupted download, is removed.
+
+    Args:
+        filepath: Path to a csv file.
+
+    Returns:
+        A date of the last candle or None if there is no file or candles.
+    '''
+    if not os.path.exists(filepath):
+        return None
+    with open(filepath, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        # Read a tail which is long enough to have the last full line.
+        tail_size = 1024
+        while True:
+            first = max(size - tail_size, 0)
+            f.seek(first)
+            tail = f.read()
+            if first == 0 or tail.count(b'\n') > 2:
+                break
+            tail_size *= 2
+        if not tail.endswith(b'\n'):
+            # Remove an incomplete line.
+            tail = tail[:tail.rfind(b'\n') + 1]
+            f.truncate(first + len(tail))
+    lines = tail.decode().splitlines()
+    if first == 0 and len(lines) < 2:
+        # There is only a header.
+        return None
+    return int(float(lines[-1].split(',')[COLUMNS.index('date')]))
 
 
 def _main(currencies: list = ['ETH', 'ETC', 'XMR', 'LTC'],
           start: int = 1575158400,
           end: int = 1575244800,
           period: int = 1800,
-          data_folder: int = 'sample_data'):
+          data_folder: int = 'sample_data',
+          fetch=None,
+          workers: int = 8,
+          rate_limit: int = 6):
     '''Download candles for specified currencies and range and save them
     to a separate csv files.
 
+    Files which already exist are continued from their last candle, and
+    candles are appended as soon as they are downloaded, so an interrupted
+    run resumes where it stopped.
+
     Args:
         currencies: List of currencies to request from Poloniex.
         start: Starting date of the requested range (UNIX timestamp, default
@@ -59,14 +181,42 @@ def _main(currencies: list = ['ETH', 'ETC', 'XMR', 'LTC'],
         period: Period for one candle in seconds (Half-hour candles by
             default).
         data_folder: Folder where to save market data.
+        fetch: A function which downloads candles, see _download.
+        workers: How many requests are made at the same time.
+        rate_limit: Maximum number of requests per second.
     '''
 
     if not os.path.exists(data_folder):
         os.makedirs(data_folder)
 
+    ranges = {}
     for currency in currencies:
-        candles = _request(currency, period, start, end)
-        df = _candles_to_df(candles)
-        df.to_csv(f"{data_folder}/{currency}.csv", index=False)
+        last_date = _last_date(f"{data_folder}/{currency}.csv")
+        if last_date is not None:
+            first = max(start, last_date + period)
+        else:
+            first = start
+        if first <= end:
+            ranges[currency] = (first, end)
+
+    files = {}
+    try:
+        for currency, candles in _download(ranges, period, fetch=fetch,
+                                           workers=workers,
+                                           rate_limit=rate_limit):
+            if currency not in files:
+                filepath = f"{data_folder}/{currency}.csv"
+                new = _last_date(filepath) is None
+                files[currency] = open(filepath, 'w' if new else 'a',
+                                       newline='')
+                if new:
+                    csv.writer(files[currency]).writerow(COLUMNS)
+            f = files[currency]
+            csv.writer(f).writerows([candle[column] for column in COLUMNS]
+                                    for candle in candles)
+            f.flush()
+    finally:
+        for f in files.values():
+            f.close()
 
     print(f"Market data saved to {data_folder}.")
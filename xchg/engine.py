@@ -0,0 +1,338 @@
+'''Array implementations of trading operations. It's for internal use only.
+
+Balances and portfolios here are arrays where the first element is a cash
+currency and the rest are currencies in the sorted order.
+'''
+
+import numpy as np
+
+# Statuses of orders.
+_NO_ORDER = 0
+_EXECUTED = 1
+_MIN_ORDER_SIZE = 2
+_INSUFFICIENT_BALANCE = 3
+_MISSING_CANDLE = 4
+_STATUSES = {_EXECUTED: 'executed',
+             _MIN_ORDER_SIZE: 'min_order_size',
+             _INSUFFICIENT_BALANCE: 'insufficient_balance',
+             _MISSING_CANDLE: 'missing_candle'}
+
+# The maximum number of time steps simulated at once by the vectorized
+# backtest.
+_CHUNK = 256
+
+
+def _capital_change(portfolio: np.ndarray, target: np.ndarray,
+                    fee: float) -> tuple:
+    '''Find how the capital changes after moving from one portfolio to
+    another.
+
+    It's a fixed point of the same equation as in the original iterative
+    solver: cc = (1 - fee * p_cash - (2 * fee - fee ** 2) * sum(max(p_i -
+    cc * t_i, 0))) / (1 - fee * t_cash). The right side is piecewise linear
+    in cc, so for a fixed set of currencies which are sold the fixed point has
+    a closed form. The set is updated from the solution until it stops
+    changing, which is Newton's method on a convex piecewise linear function
+    and takes at most N + 1 iterations, usually one or two.
+
+    Args:
+        portfolio: Current portfolios with a shape (K, N + 1).
+        target: Desired portfolios with a shape (K, N + 1).
+        fee: A trading fee.
+
+    Returns:
+        A tuple with capital change coefficients for each of K portfolios, a
+        number of iterations and residuals of the equation.
+    '''
+    k = 2 * fee - fee ** 2
+    cc = np.full(len(portfolio), 1 - k)
+    sold = portfolio[:, 1:] > cc[:, None] * target[:, 1:]
+    iterations = 0
+    while True:
+        iterations += 1
+        cc = (1 - fee * portfolio[:, 0]
+              - k * np.where(sold, portfolio[:, 1:], 0).sum(axis=1)) \
+            / (1 - fee * target[:, 0]
+               - k * np.where(sold, target[:, 1:], 0).sum(axis=1))
+        new_sold = portfolio[:, 1:] > cc[:, None] * target[:, 1:]
+        if (new_sold == sold).all() or iterations > portfolio.shape[1]:
+            break
+        sold = new_sold
+
+    sell_amount = np.clip(portfolio[:, 1:] - cc[:, None] * target[:, 1:],
+                          0, None).sum(axis=1)
+    residual = np.abs(cc - (1 - fee * portfolio[:, 0] - k * sell_amount)
+                      / (1 - fee * target[:, 0]))
+    return cc, iterations, residual
+
+
+def _values(balance: np.ndarray, prices: np.ndarray) -> np.ndarray:
+    '''Find values of balances in a cash currency. An empty balance is worth
+    nothing, even before the first candle of the currency where its price is
+    NaN.
+
+    Args:
+        balance: Balances with a shape (N + 1,) or (K, N + 1).
+        prices: Close prices with a shape (N,) or (K, N).
+
+    Returns:
+        An array with the shape of balance.
+    '''
+    values = balance.copy()
+    values[..., 1:] = np.where(balance[..., 1:] != 0,
+                               balance[..., 1:] * prices, 0.0)
+    return values
+
+
+def _target_amounts(balance: np.ndarray, prices: np.ndarray,
+                    target: np.ndarray, fee: float,
+                    missing: np.ndarray) -> tuple:
+    '''Find how much of each currency to receive to make desired portfolios.
+
+    Currencies at missing candles can't be traded, so they keep their
+    balances, and the rest of the capital is split in proportion to the
+    target.
+
+    Args:
+        balance: Current balances with a shape (K, N + 1).
+        prices: Close prices with a shape (K, N).
+        target: Desired portfolios with a shape (K, N + 1).
+        fee: A trading fee.
+        missing: A boolean array of missing candles with a shape (K, N).
+
+    Returns:
+        A tuple with amounts with a shape (K, N), a number of iterations and
+        residuals of the solver.
+    '''
+    values = _values(balance, prices)
+    if missing.any():
+        values[:, 1:][missing] = 0.0
+        target = np.where(np.column_stack((np.zeros(len(missing), bool),
+                                           missing)), 0.0, target)
+        # A target of frozen currencies only is kept in cash.
+        target[target.sum(axis=1) == 0, 0] = 1.0
+        target /= target.sum(axis=1)[:, None]
+    capital = values.sum(axis=1)
+    cc, iterations, residual = _capital_change(values / capital[:, None],
+                                               target, fee)
+    amount = np.where(missing, 0.0, (capital * cc)[:, None] * target[:, 1:]
+                      / prices - balance[:, 1:])
+    return amount, iterations, residual
+
+
+def _rebalance(balance: np.ndarray, prices: np.ndarray, target: np.ndarray,
+               fee: float, min_order_size: float) -> np.ndarray:
+    '''Make a desired portfolio from a balance at given prices.
+
+    It's the same as _capital_change and _trade for one portfolio, but with
+    fewer array operations, because a backtest calls it at every step where
+    some order is rejected. Rare cases, where a balance or cash runs out, are
+    passed to _trade.
+
+    Args:
+        balance: A current balance with a shape (N + 1,).
+        prices: Close prices with a shape (N,).
+        target: A desired portfolio with a shape (N + 1,).
+        fee: A trading fee.
+        min_order_size: A minimum order size.
+
+    Returns:
+        A new balance.
+    '''
+    units = balance[1:]
+    capital = balance[0] + units @ prices
+    portfolio = units * prices / capital
+
+    # The same fixed point as in _capital_change.
+    k = 2 * fee - fee ** 2
+    cc = 1 - k
+    sold = portfolio > cc * target[1:]
+    for _ in range(len(balance) + 1):
+        cc = (1 - fee * balance[0] / capital - k * (portfolio @ sold)) \
+            / (1 - fee * target[0] - k * (target[1:] @ sold))
+        new_sold = portfolio > cc * target[1:]
+        if (new_sold == sold).all():
+            break
+        sold = new_sold
+
+    # Sell first and then buy, with the same checks as _trade.
+    amount = capital * cc * target[1:] / prices - units
+    value = amount * prices
+    sell = amount < 0
+    order = np.where(sell, -value, value / (1 - fee))
+    executed = (amount != 0) & (order >= min_order_size)
+    cash = balance[0] + (order @ (executed & sell)) * (1 - fee)
+    cost = order @ (executed & ~sell)
+    if cost > cash or (sell & (-amount > units + 1e-10)).any():
+        return _trade(balance, prices, amount, fee, min_order_size)[0]
+    result = np.empty_like(balance)
+    result[0] = cash - cost
+    result[1:] = np.where(executed, np.maximum(units + amount, 0.0), units)
+    return result
+
+
+def _trade(balance: np.ndarray, prices: np.ndarray, amount: np.ndarray,
+           fee: float, min_order_size: float) -> tuple:
+    '''Sell currencies with a negative amount and then buy currencies with a
+    positive amount, with the same checks as Xchg.sell and Xchg.buy.
+
+    Args:
+        balance: A current balance with a shape (N + 1,), or balances of K
+            independent exchanges with a shape (K, N + 1).
+        prices: Close prices with a shape (N,) or (K, N).
+        amount: How much units of each currency to receive after trading,
+            with a shape (N,) or (K, N).
+        fee: A trading fee.
+        min_order_size: A minimum order size.
+
+    Returns:
+        A new balance and a status of an order for each currency.
+    '''
+    if balance.ndim == 1:
+        balance, status = _trade(balance[None], prices[None], amount[None],
+                                 fee, min_order_size)
+        return balance[0], status[0]
+
+    balance = balance.copy()
+    cash = balance[:, 0]
+    units = balance[:, 1:]
+    status = np.full(amount.shape, _NO_ORDER)
+
+    # Sell first.
+    without_fee = prices * -amount
+    sell = amount < 0
+    insufficient = sell & (-amount > units + 1e-10)
+    small = sell & ~insufficient & (without_fee < min_order_size)
+    sell &= ~insufficient & ~small
+    status[insufficient] = _INSUFFICIENT_BALANCE
+    status[small] = _MIN_ORDER_SIZE
+    status[sell] = _EXECUTED
+    units[sell] = np.maximum(units[sell] + amount[sell], 0.0)
+    cash += np.where(sell, without_fee, 0.0).sum(axis=1) * (1 - fee)
+
+    # Then buy.
+    cost = prices * amount / (1 - fee)
+    status[(amount > 0) & (cost < min_order_size)] = _MIN_ORDER_SIZE
+    buy = (amount > 0) & (cost >= min_order_size)
+    total = np.where(buy, cost, 0.0).sum(axis=1)
+    fits = total <= cash
+    if fits.any():
+        rows = buy & fits[:, None]
+        units[rows] += amount[rows]
+        cash[fits] -= total[fits]
+        status[rows] = _EXECUTED
+    if not fits.all():
+        # Cash runs out, so orders are checked one by one as Xchg.buy does.
+        for i in range(amount.shape[1]):
+            rows = buy[:, i] & ~fits
+            ok = rows & (cost[:, i] <= cash + 1e-10)
+            units[ok, i] += amount[ok, i]
+            cash[ok] = np.maximum(cash[ok] - cost[ok, i], 0.0)
+            status[ok, i] = _EXECUTED
+            status[rows & ~ok, i] = _INSUFFICIENT_BALANCE
+    return balance, status
+
+
+def _backtest(close: np.ndarray, balance: np.ndarray, weights: np.ndarray,
+              fee: float, min_order_size: float) -> np.ndarray:
+    '''Make a desired portfolio at every step.
+
+    Steps where every order passes the checks are computed at once: after
+    trading the portfolio matches the target exactly, so the portfolio before
+    the next trade only depends on price changes. A step where some order is
+    rejected is simulated separately with _rebalance. Orders are often
+    rejected at many steps in a row, for example small orders with a fixed
+    portfolio, so after a failed try the vectorized part waits for twice as
+    many separate steps as before, up to a chunk.
+
+    Args:
+        close: Close prices with a shape (T, N).
+        balance: An initial balance with a shape (N + 1,).
+        weights: Desired portfolios with a shape (T, N + 1).
+        fee: A trading fee.
+        min_order_size: A minimum order size.
+
+    Returns:
+        Balances after trading at each step with a shape (T, N + 1).
+    '''
+    steps = len(weights)
+    balances = np.empty((steps, len(balance)))
+    balances[0] = _rebalance(balance, close[0], weights[0], fee,
+                             min_order_size)
+    t = 1
+    size = 1
+    # How many steps are simulated one by one before the vectorized part is
+    # tried again, and how many it will be after the next failed try.
+    wait = 0
+    backoff = 1
+    while t < steps:
+        if wait == 0:
+            chunk = _drift(balances[t - 1], close[t - 1:t + size],
+                           weights[t - 1:t + size], fee, min_order_size)
+            balances[t:t + len(chunk)] = chunk
+            t += len(chunk)
+            if len(chunk) == size:
+                # Grow a chunk while steps pass the checks.
+                size = min(size * 2, _CHUNK)
+                backoff = 1
+                continue
+            # Orders are rejected at the next step, and probably at the
+            # following ones too, so the vectorized part is tried less often
+            # while it keeps failing.
+            size = 1
+            wait = backoff
+            backoff = 1 if len(chunk) else min(backoff * 2, _CHUNK)
+            if t == steps:
+                break
+        balances[t] = _rebalance(balances[t - 1], close[t], weights[t], fee,
+                                 min_order_size)
+        t += 1
+        wait -= 1
+    return balances
+
+
+def _drift(balance: np.ndarray, close: np.ndarray, weights: np.ndarray,
+           fee: float, min_order_size: float) -> np.ndarray:
+    '''Simulate steps while every order passes the checks.
+
+    Args:
+        balance: A balance after trading at the step before the first one.
+        close: Close prices with a shape (S + 1, N), starting with the step
+            before the first one.
+        weights: Desired portfolios with a shape (S + 1, N + 1), starting with
+            the step before the first one.
+        fee: A trading fee.
+        min_order_size: A minimum order size.
+
+    Returns:
+        Balances after trading for steps until the first one with a rejected
+        order.
+    '''
+    prices = np.hstack((np.ones((len(close), 1)), close))
+
+    # Value of each currency before trading, per one unit of the capital
+    # after the previous trade.
+    before = np.empty((len(close) - 1, prices.shape[1]))
+    before[0] = balance * prices[1]
+    before[0] /= balance @ prices[0]
+    before[1:] = weights[1:-1] * prices[2:] / prices[1:-1]
+    growth = before.sum(axis=1)
+    portfolio = before / growth[:, None]
+
+    target = weights[1:]
+    cc = _capital_change(portfolio, target, fee)[0]
+    capital = (balance @ prices[0]) * np.cumprod(growth * cc)
+    pre_capital = capital / cc
+
+    # Check orders of each step in the same way as Xchg.sell and Xchg.buy.
+    delta = capital[:, None] * target[:, 1:] \
+        - pre_capital[:, None] * portfolio[:, 1:]
+    order = np.where(delta > 0, delta / (1 - fee), -delta)
+    rejected = ((order > 1e-10) & (order < min_order_size)).any(axis=1)
+    cash = pre_capital * portfolio[:, 0] \
+        + np.clip(-delta, 0, None).sum(axis=1) * (1 - fee) \
+        - np.clip(delta, 0, None).sum(axis=1) / (1 - fee)
+    rejected |= cash < -1e-10
+    valid = np.argmax(rejected) if rejected.any() else len(rejected)
+
+    return capital[:valid, None] * target[:valid] / prices[1:valid + 1]
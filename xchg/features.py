@@ -0,0 +1,179 @@
+'''Rolling indicators computed over whole columns of candles.
+
+Each indicator takes a columnar candles store and returns an array with a
+shape (T, N), where values at the first candles, which don't have enough
+history, are NaN. Prices before the first candle of a currency are NaN too,
+so its history starts at its first candle.
+'''
+
+import numpy as np
+
+# A number of candles which are smoothed at once by ema.
+_BLOCK = 256
+
+
+class Features:
+    def __init__(self, candles):
+        '''Create a cache of indicators over candles.
+
+        Args:
+            candles: A Candles store.
+        '''
+        self.__candles = candles
+        self.__cache = {}
+
+    def __call__(self, name: str, **params) -> np.ndarray:
+        '''Get an indicator over all candles. It's computed on the first call
+        and then taken from the cache.
+
+        Args:
+            name: A name of the indicator: 'returns', 'sma', 'ema',
+                'volatility' or 'volume_ratio'.
+            params: Parameters of the indicator, see functions with the same
+                names in this module.
+
+        Returns:
+            An array with a shape (T, N).
+        '''
+        key = (name, tuple(sorted(params.items())))
+        if key not in self.__cache:
+            if name not in _INDICATORS:
+                raise KeyError(f"Unknown indicator {name}.")
+            self.__cache[key] = _INDICATORS[name](self.__candles, **params)
+        return self.__cache[key]
+
+
+def returns(candles, period: int = 1, column: str = 'close') -> np.ndarray:
+    '''Relative change of a column since period candles ago.
+
+    Args:
+        candles: A Candles store.
+        period: A number of candles.
+        column: A name of the column.
+
+    Returns:
+        An array with a shape (T, N).
+    '''
+    values = candles.column(column)
+    result = np.full(values.shape, np.nan)
+    result[period:] = values[period:] / values[:-period] - 1
+    return result
+
+
+def sma(candles, window: int, column: str = 'close') -> np.ndarray:
+    '''Simple moving average of a column.
+
+    Args:
+        candles: A Candles store.
+        window: A number of candles to average.
+        column: A name of the column.
+
+    Returns:
+        An array with a shape (T, N).
+    '''
+    values = candles.column(column)
+    result = np.full(values.shape, np.nan)
+    result[window - 1:] = _rolling_sum(values, window) / window
+    return result
+
+
+def ema(candles, span: int, column: str = 'close') -> np.ndarray:
+    '''Exponential moving average of a column with a smoothing factor
+    2 / (span + 1), which starts from the first value.
+
+    The recursion is unrolled over blocks of candles: inside a block the
+    average is a product of the values and a matrix of decay weights plus a
+    decayed average before the block.
+
+    Args:
+        candles: A Candles store.
+        span: A span of the average in candles.
+        column: A name of the column.
+
+    Returns:
+        An array with a shape (T, N).
+    '''
+    values = candles.column(column)
+    # Values before the first known one are replaced with it, so the average
+    # of each currency starts from its first value.
+    first = np.argmax(~np.isnan(values), axis=0)
+    leading = np.arange(len(values))[:, None] < first
+    values = np.where(leading, values[first, np.arange(values.shape[1])],
+                      values)
+    alpha = 2 / (span + 1)
+    steps = np.arange(_BLOCK)
+    lags = steps[:, None] - steps[None, :]
+    weights = np.where(lags >= 0, alpha * (1 - alpha) ** np.abs(lags), 0.0)
+    decay = (1 - alpha) ** (steps + 1)
+    result = np.empty(values.shape)
+    previous = values[0]
+    for start in range(0, len(values), _BLOCK):
+        block = values[start:start + _BLOCK]
+        size = len(block)
+        result[start:start + size] = weights[:size, :size] @ block \
+            + decay[:size, None] * previous
+        previous = result[start + size - 1]
+    result[leading] = np.nan
+    return result
+
+
+def volatility(candles, window: int, column: str = 'close') -> np.ndarray:
+    '''Standard deviation of logarithmic returns of a column over a rolling
+    window, computed from cumulative sums of returns and their squares.
+
+    Args:
+        candles: A Candles store.
+        window: A number of returns.
+        column: A name of the column.
+
+    Returns:
+        An array with a shape (T, N).
+    '''
+    values = candles.column(column)
+    log_returns = np.diff(np.log(values), axis=0)
+    total = _rolling_sum(log_returns, window)
+    variance = (_rolling_sum(log_returns ** 2, window)
+                - total ** 2 / window) / (window - 1)
+    result = np.full(values.shape, np.nan)
+    result[window:] = np.sqrt(np.clip(variance, 0, None))
+    return result
+
+
+def volume_ratio(candles, window: int,
+                 column: str = 'volume') -> np.ndarray:
+    '''Ratio of a volume to its simple moving average.
+
+    Args:
+        candles: A Candles store.
+        window: A number of candles to average.
+        column: A name of the volume column.
+
+    Returns:
+        An array with a shape (T, N).
+    '''
+    return candles.column(column) / sma(candles, window, column)
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    '''Sums of values over a rolling window, computed from cumulative sums.
+    A sum is NaN if any value in its window is NaN, and NaNs don't spoil the
+    following windows.
+
+    Args:
+        values: An array with a shape (T, N).
+        window: A number of values in a sum.
+
+    Returns:
+        An array with a shape (T - window + 1, N).
+    '''
+    unknown = np.isnan(values)
+    sums = np.zeros((len(values) + 1, values.shape[1]))
+    counts = np.zeros((len(values) + 1, values.shape[1]), dtype=np.int64)
+    np.cumsum(np.where(unknown, 0.0, values), axis=0, out=sums[1:])
+    np.cumsum(unknown, axis=0, out=counts[1:])
+    return np.where(counts[window:] > counts[:-window], np.nan,
+                    sums[window:] - sums[:-window])
+
+
+_INDICATORS = {'returns': returns, 'sma': sma, 'ema': ema,
+               'volatility': volatility, 'volume_ratio': volume_ratio}
@@ -0,0 +1,174 @@
+'''Optional counters, timers and hooks for the exchange simulator.
+
+Instrumentation is disabled by default, and then it costs only a check of the
+enabled flag. After enable() the simulator counts executed and rejected orders,
+measures time of next_step, make_portfolio and data loading, and passes every
+event to subscribed hooks:
+
+    from xchg import instrumentation
+
+    instrumentation.enable()
+    instrumentation.subscribe(lambda event, data: print(event, data))
+    ...
+    print(instrumentation.counters())
+    print(instrumentation.timings())
+'''
+
+import math
+from collections import Counter
+
+# Whether instrumentation is enabled. Use enable() and disable() to change it.
+enabled = False
+
+_counters = Counter()
+_timings = {}
+_hooks = []
+
+
+class _Histogram:
+    def __init__(self):
+        '''Create an empty histogram of durations with buckets which grow by
+        powers of two, starting from one microsecond.'''
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.buckets = Counter()
+
+    def add(self, seconds: float) -> None:
+        '''Add a duration to the histogram.
+
+        Args:
+            seconds: A duration in seconds.
+        '''
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        exponent = max(math.ceil(math.log2(max(seconds, 1e-12) / 1e-6)), 0)
+        self.buckets[1e-6 * 2 ** exponent] += 1
+
+    def as_dict(self) -> dict:
+        '''Get the histogram as a dictionary.
+
+        Returns:
+            A dictionary with a count, a total, a minimum and a maximum
+            duration, and buckets where keys are upper bounds in seconds and
+            values are numbers of durations.
+        '''
+        return {'count': self.count,
+                'total': self.total,
+                'min': self.min,
+                'max': self.max,
+                'buckets': dict(sorted(self.buckets.items()))}
+
+
+def enable() -> None:
+    '''Enable instrumentation.'''
+    global enabled
+    enabled = True
+
+
+def disable() -> None:
+    '''Disable instrumentation. Collected values are kept.'''
+    global enabled
+    enabled = False
+
+
+def reset() -> None:
+    '''Clear all counters and timings.'''
+    _counters.clear()
+    _timings.clear()
+
+
+def counters() -> dict:
+    '''Get counters.
+
+    Returns:
+        A dictionary where keys are counter names, for example
+        'orders_executed' or 'orders_rejected_min_order_size', and values are
+        counts.
+    '''
+    return dict(_counters)
+
+
+def timings() -> dict:
+    '''Get histograms of durations.
+
+    Returns:
+        A dictionary where keys are names of operations ('next_step',
+        'make_portfolio' and 'load') and values are histograms.
+    '''
+    return {name: histogram.as_dict() for name, histogram in _timings.items()}
+
+
+def subscribe(hook) -> None:
+    '''Subscribe a hook to events.
+
+    Args:
+        hook: A function which takes an event name and a dictionary with
+            event data.
+    '''
+    _hooks.append(hook)
+
+
+def unsubscribe(hook) -> None:
+    '''Unsubscribe a hook from events.
+
+    Args:
+        hook: A previously subscribed function.
+    '''
+    _hooks.remove(hook)
+
+
+def _count(name: str, value: int = 1) -> None:
+    '''Increase a counter.
+
+    Args:
+        name: A name of the counter.
+        value: How much to add.
+    '''
+    _counters[name] += value
+
+
+def _time(name: str, seconds: float, **data) -> None:
+    '''Record a duration of an operation and pass it to hooks.
+
+    Args:
+        name: A name of the operation.
+        seconds: A duration in seconds.
+        data: Additional event data.
+    '''
+    if name not in _timings:
+        _timings[name] = _Histogram()
+    _timings[name].add(seconds)
+    _event(name, seconds=seconds, **data)
+
+
+def _event(name: str, **data) -> None:
+    '''Pass an event to hooks.
+
+    Args:
+        name: A name of the event.
+        data: Event data.
+    '''
+    for hook in _hooks:
+        hook(name, data)
+
+
+def _order(currency: str, side: str, amount: float, status: str) -> None:
+    '''Count an order and pass it to hooks.
+
+    Args:
+        currency: A name of the currency.
+        side: 'buy' or 'sell'.
+        amount: How much units of the currency were requested.
+        status: 'executed' or a reason of rejection, 'min_order_size',
+            'insufficient_balance' or 'missing_candle'.
+    '''
+    if status == 'executed':
+        _counters['orders_executed'] += 1
+    else:
+        _counters[f"orders_rejected_{status}"] += 1
+    _event('order', currency=currency, side=side, amount=amount,
+           status=status)
@@ -0,0 +1,83 @@
+'''A compact record of executed trades.'''
+
+from array import array
+import numpy as np
+
+# Sides of trades.
+BUY = 1
+SELL = -1
+
+# Columns of the ledger with typecodes of their buffers.
+_COLUMNS = {'position': 'q', 'currency': 'i', 'side': 'b', 'amount': 'd',
+            'price': 'd', 'fee': 'd'}
+
+
+class Ledger:
+    def __init__(self):
+        '''Create an empty ledger. Each column is kept in a growable typed
+        array, so recording a trade appends a few numbers and creates no
+        Python objects.'''
+        self.__buffers = {name: array(typecode)
+                          for name, typecode in _COLUMNS.items()}
+
+    def __len__(self):
+        '''Returns the number of trades.'''
+        return len(self.__buffers['position'])
+
+    def append(self, position: int, currency: int, side: int, amount: float,
+               price: float, fee: float) -> None:
+        '''Record a trade.
+
+        Args:
+            position: An index of the candle where the trade was made.
+            currency: An index of the currency in the sorted currencies.
+            side: BUY or SELL.
+            amount: How much units of the currency were bought or sold,
+                before the fee.
+            price: A price expressed in a cash currency.
+            fee: A paid fee expressed in a cash currency.
+        '''
+        buffers = self.__buffers
+        buffers['position'].append(position)
+        buffers['currency'].append(currency)
+        buffers['side'].append(side)
+        buffers['amount'].append(amount)
+        buffers['price'].append(price)
+        buffers['fee'].append(fee)
+
+    def extend(self, position: int, currency: np.ndarray, side: np.ndarray,
+               amount: np.ndarray, price: np.ndarray,
+               fee: np.ndarray) -> None:
+        '''Record several trades made at one candle.
+
+        Args:
+            position: An index of the candle where trades were made.
+            currency: Indexes of currencies.
+            side: BUY or SELL for each trade.
+            amount: How much units of each currency were bought or sold,
+                before the fee.
+            price: Prices expressed in a cash currency.
+            fee: Paid fees expressed in a cash currency.
+        '''
+        values = {'position': np.full(len(currency), position),
+                  'currency': currency, 'side': side, 'amount': amount,
+                  'price': price, 'fee': fee}
+        for name, typecode in _COLUMNS.items():
+            self.__buffers[name].frombytes(
+                np.asarray(values[name], dtype=typecode).tobytes())
+
+    def arrays(self) -> dict:
+        '''Get all trades at once.
+
+        Returns:
+            A dictionary where keys are 'position', 'currency', 'side',
+            'amount', 'price' and 'fee', and values are numpy arrays with one
+            element for each trade.
+        '''
+        return {name: np.array(buffer, dtype=buffer.typecode)
+                for name, buffer in self.__buffers.items()}
+
+    def clear(self) -> None:
+        '''Remove all trades.'''
+        for name, typecode in _COLUMNS.items():
+            self.__buffers[name] = array(typecode)
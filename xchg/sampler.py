@@ -0,0 +1,50 @@
+'''Random episodes over one loaded dataset.'''
+
+import numpy as np
+from .xchg import Xchg
+
+
+class EpisodeSampler:
+    def __init__(self, x: Xchg, length: int, rng=None):
+        '''Create a sampler of episodes with a fixed length which start at
+        random candles. Episodes are views of the same candles, see
+        Xchg.window, so sampling copies no data.
+
+        Args:
+            x: An exchange whose timeline and balance are used for episodes.
+            length: A number of candles in each episode.
+            rng: A seed or a numpy random generator, for reproducible
+                sampling.
+        '''
+        if not 0 < length <= len(x):
+            raise ValueError(f"An episode of {length} candles does not fit "
+                             f"into {len(x)} candles.")
+        self.x = x
+        self.length = length
+        self.rng = np.random.default_rng(rng)
+
+    def __iter__(self):
+        '''Returns an endless iterator over random episodes.'''
+        while True:
+            yield self.sample()
+
+    def starts(self, number: int = None):
+        '''Get random starting candles of episodes.
+
+        Args:
+            number: A number of episodes, one by default.
+
+        Returns:
+            An index of the first candle, or an array of them if number is
+            set.
+        '''
+        return self.rng.integers(0, len(self.x) - self.length + 1, number)
+
+    def sample(self) -> Xchg:
+        '''Get a random episode.
+
+        Returns:
+            A Xchg instance with the length candles.
+        '''
+        start = int(self.starts())
+        return self.x.window(start, start + self.length)
@@ -0,0 +1,535 @@
+'''A server which loads candles once and hosts many simulation sessions, and
+clients for it.
+
+Clients talk to the server over a unix or a TCP socket with a compact binary
+protocol. Every message starts with a header with a length of the payload, a
+request id and an operation code (a status in responses). Responses carry the
+same request id, so a client can send many requests without waiting for
+responses:
+
+    server = Server(0.002, 0.0001, data_path='data/')
+    await server.start(path='/tmp/xchg.sock')
+
+    client = await Client.connect(path='/tmp/xchg.sock')
+    await client.open_session('alice')
+    states = await asyncio.gather(client.buy('alice', 'ETH', 0.1),
+                                  client.next_step('alice'))
+'''
+
+import argparse
+import asyncio
+import itertools
+import socket
+import struct
+import numpy as np
+from .candles import Candles
+from .common import _read_candles
+from .xchg import Xchg
+
+# A header of requests and responses: a length of the payload, a request id
+# and an operation code or a status.
+_HEADER = struct.Struct('<IIB')
+_LENGTH = struct.Struct('<H')
+_DOUBLE = struct.Struct('<d')
+_STEPS = struct.Struct('<I')
+_INFO = struct.Struct('<ddqH')
+# A state of a session: a position, a number of candles left, a date and a
+# capital, followed by a balance.
+_STATE = struct.Struct('<qqdd')
+
+# Operation codes.
+_INFO_OP = 0
+_OPEN = 1
+_CLOSE = 2
+_STATE_OP = 3
+_BUY = 4
+_SELL = 5
+_MAKE_PORTFOLIO = 6
+_NEXT_STEP = 7
+
+# Statuses of responses.
+_OK = 0
+_ERROR = 1
+
+
+class ServerError(Exception):
+    '''An error which happened on the server while handling a request.'''
+
+
+class Server:
+    def __init__(self, fee, min_order_size, data_path=None, candles=None):
+        '''Create a server. Candles are loaded once and shared by all
+        sessions.
+
+        Args:
+          fee: What part of a trade volume will be paid as fee.
+          min_order_size: Minimum trade volume expressed in a base currency
+              (cash).
+          data_path: Where csv files with data are stored.
+          candles: A list of candles or a Candles store, it's used when
+              data_path is not set.
+        '''
+        if data_path is not None:
+            candles = _read_candles(data_path)
+        elif isinstance(candles, list):
+            candles = Candles.from_list(candles)
+        self.__candles = candles
+        self.__template = Xchg(fee, min_order_size, candles=candles)
+        self.__sessions = {}
+        self.__server = None
+
+    @property
+    def sessions(self) -> dict:
+        '''Get hosted sessions.
+
+        Returns:
+            A dictionary where keys are names of sessions and values are
+            their current Xchg instances.
+        '''
+        return self.__sessions
+
+    async def start(self, path: str = None, host: str = None,
+                    port: int = None) -> None:
+        '''Start listening on a unix socket or on a TCP port.
+
+        Args:
+            path: A path of a unix socket.
+            host: A host to listen on, when path is not set.
+            port: A port to listen on, when path is not set.
+        '''
+        if path is not None:
+            self.__server = await asyncio.start_unix_server(self._handle,
+                                                            path)
+        else:
+            self.__server = await asyncio.start_server(self._handle, host,
+                                                       port)
+
+    async def serve_forever(self) -> None:
+        '''Handle requests until the server is closed.'''
+        await self.__server.serve_forever()
+
+    async def close(self) -> None:
+        '''Stop listening and wait until the server is closed.'''
+        self.__server.close()
+        await self.__server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter) -> None:
+        '''Handle requests of one connection in the order they come.
+
+        Args:
+            reader: A stream of requests.
+            writer: A stream of responses.
+        '''
+        try:
+            while True:
+                length, request_id, operation = _HEADER.unpack(
+                    await reader.readexactly(_HEADER.size))
+                payload = await reader.readexactly(length)
+                try:
+                    status, body = _OK, self._call(operation, payload)
+                except StopIteration:
+                    status, body = _ERROR, b'There are no more candles.'
+                except (KeyError, ValueError, IndexError, struct.error,
+                        UnicodeDecodeError) as e:
+                    status, body = _ERROR, repr(e).encode()
+                writer.write(_HEADER.pack(len(body), request_id, status)
+                             + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _call(self, operation: int, payload: bytes) -> bytes:
+        '''Execute a request.
+
+        Args:
+            operation: An operation code.
+            payload: Arguments of the operation.
+
+        Returns:
+            A payload of the response.
+        '''
+        if operation == _INFO_OP:
+            currencies = self.__candles.currencies
+            return _INFO.pack(self.__template.fee,
+                              self.__template.min_order_size,
+                              len(self.__candles), len(currencies)) \
+                + b''.join(_pack_str(currency) for currency in currencies)
+
+        session, offset = _unpack_str(payload, 0)
+        if operation == _OPEN:
+            balance = _DOUBLE.unpack_from(payload, offset)[0]
+            self.__sessions[session] = Xchg(
+                self.__template.fee, self.__template.min_order_size,
+                balance=balance, candles=self.__candles)
+        elif operation == _CLOSE:
+            del self.__sessions[session]
+            return b''
+        elif operation in (_BUY, _SELL):
+            currency, offset = _unpack_str(payload, offset)
+            amount = _DOUBLE.unpack_from(payload, offset)[0]
+            x = self.__sessions[session]
+            self.__sessions[session] = x.buy(currency, amount) \
+                if operation == _BUY else x.sell(currency, amount)
+        elif operation == _MAKE_PORTFOLIO:
+            x = self.__sessions[session]
+            target = np.frombuffer(payload, dtype='<f8', offset=offset,
+                                   count=len(x.currencies) + 1)
+            self.__sessions[session] = x.make_portfolio(
+                dict(zip(['cash'] + x.currencies, target.tolist())))
+        elif operation == _NEXT_STEP:
+            steps = _STEPS.unpack_from(payload, offset)[0]
+            x = self.__sessions[session]
+            self.__sessions[session] = x.next_step(steps)
+        elif operation != _STATE_OP:
+            raise ValueError(f"Unknown operation {operation}.")
+        return self._state(self.__sessions[session])
+
+    def _state(self, x: Xchg) -> bytes:
+        '''Pack a state of a session.
+
+        Args:
+            x: A current instance of the session.
+
+        Returns:
+            A packed position, a number of candles left, a date, a capital and
+            a balance.
+        '''
+        balance = np.array([x.balance[currency] for currency
+                            in ['cash'] + x.currencies], dtype='<f8')
+        return _STATE.pack(len(self.__candles) - len(x), len(x),
+                           x.data_start, x.capital) + balance.tobytes()
+
+
+class _Methods:
+    '''Operations of clients. Each of them passes a request to _call, which
+    returns a result in a sync client and an awaitable in an async client.'''
+
+    def _info(self, body: bytes) -> None:
+        '''Remember settings of the server.
+
+        Args:
+            body: A payload of the response.
+        '''
+        self.fee, self.min_order_size, self.length, number = \
+            _INFO.unpack_from(body)
+        offset = _INFO.size
+        self.currencies = []
+        for _ in range(number):
+            currency, offset = _unpack_str(body, offset)
+            self.currencies.append(currency)
+
+    def _state(self, body: bytes) -> dict:
+        '''Unpack a state of a session.
+
+        Args:
+            body: A payload of the response.
+
+        Returns:
+            A dictionary with a position, a number of candles left (length), a
+            date of the current candle, a capital and a balance.
+        '''
+        position, length, date, capital = _STATE.unpack_from(body)
+        balance = np.frombuffer(body, dtype='<f8', offset=_STATE.size)
+        return {'position': position,
+                'length': length,
+                'date': date,
+                'capital': capital,
+                'balance': dict(zip(['cash'] + self.currencies,
+                                    balance.tolist()))}
+
+    def open_session(self, session: str, balance: float = 1.0):
+        '''Create a session or start it again.
+
+        Args:
+            session: A name of the session.
+            balance: An initial cash balance.
+
+        Returns:
+            A state of the session.
+        '''
+        return self._call(_OPEN, _pack_str(session) + _DOUBLE.pack(balance),
+                          self._state)
+
+    def close_session(self, session: str):
+        '''Remove a session.
+
+        Args:
+            session: A name of the session.
+        '''
+        return self._call(_CLOSE, _pack_str(session), lambda body: None)
+
+    def state(self, session: str):
+        '''Get a state of a session.
+
+        Args:
+            session: A name of the session.
+
+        Returns:
+            A state of the session.
+        '''
+        return self._call(_STATE_OP, _pack_str(session), self._state)
+
+    def buy(self, session: str, currency: str, amount: float):
+        '''Buy currency, see Xchg.buy.
+
+        Args:
+            session: A name of the session.
+            currency: A name of the currency.
+            amount: How much units of this currency to buy.
+
+        Returns:
+            A state of the session.
+        '''
+        return self._call(_BUY, _pack_str(session) + _pack_str(currency)
+                          + _DOUBLE.pack(amount), self._state)
+
+    def sell(self, session: str, currency: str, amount: float):
+        '''Sell currency, see Xchg.sell.
+
+        Args:
+            session: A name of the session.
+            currency: A name of the currency.
+            amount: How much units of this currency to sell.
+
+        Returns:
+            A state of the session.
+        '''
+        return self._call(_SELL, _pack_str(session) + _pack_str(currency)
+                          + _DOUBLE.pack(amount), self._state)
+
+    def make_portfolio(self, session: str, target_portfolio: dict):
+        '''Make a desired portfolio, see Xchg.make_portfolio.
+
+        Args:
+            session: A name of the session.
+            target_portfolio: A desired portfolio.
+
+        Returns:
+            A state of the session.
+        '''
+        target = np.array([target_portfolio[currency] for currency
+                           in ['cash'] + self.currencies], dtype='<f8')
+        return self._call(_MAKE_PORTFOLIO,
+                          _pack_str(session) + target.tobytes(), self._state)
+
+    def next_step(self, session: str, steps: int = 1):
+        '''Go to the next step in timeline, see Xchg.next_step.
+
+        Args:
+            session: A name of the session.
+            steps: How many candles to skip at once.
+
+        Returns:
+            A state of the session.
+        '''
+        return self._call(_NEXT_STEP, _pack_str(session) + _STEPS.pack(steps),
+                          self._state)
+
+
+class Client(_Methods):
+    '''An asyncio client. Its operations are coroutines, and many of them can
+    run at once over one connection, for example with asyncio.gather.'''
+
+    def __init__(self, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter):
+        '''Create a client over an open connection, use connect instead.
+
+        Args:
+            reader: A stream of responses.
+            writer: A stream of requests.
+        '''
+        self.__reader = reader
+        self.__writer = writer
+        self.__ids = itertools.count()
+        self.__pending = {}
+        self.__responses = asyncio.ensure_future(self.__read())
+
+    @classmethod
+    async def connect(cls, path: str = None, host: str = None,
+                      port: int = None) -> 'Client':
+        '''Connect to a server over a unix socket or TCP.
+
+        Args:
+            path: A path of a unix socket.
+            host: A host of the server, when path is not set.
+            port: A port of the server, when path is not set.
+
+        Returns:
+            A connected client.
+        '''
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        client = cls(reader, writer)
+        await client._call(_INFO_OP, b'', client._info)
+        return client
+
+    async def close(self) -> None:
+        '''Close the connection.'''
+        self.__writer.close()
+        await self.__writer.wait_closed()
+        await self.__responses
+
+    async def _call(self, operation: int, payload: bytes, parse):
+        '''Send a request and wait for its response.
+
+        Args:
+            operation: An operation code.
+            payload: Arguments of the operation.
+            parse: A function which unpacks a payload of the response.
+
+        Returns:
+            An unpacked response.
+        '''
+        request_id = next(self.__ids) & 0xFFFFFFFF
+        future = asyncio.get_running_loop().create_future()
+        self.__pending[request_id] = future
+        self.__writer.write(_HEADER.pack(len(payload), request_id, operation)
+                            + payload)
+        await self.__writer.drain()
+        return parse(await future)
+
+    async def __read(self) -> None:
+        '''Pass responses to requests which wait for them.'''
+        try:
+            while True:
+                length, request_id, status = _HEADER.unpack(
+                    await self.__reader.readexactly(_HEADER.size))
+                body = await self.__reader.readexactly(length)
+                future = self.__pending.pop(request_id)
+                if status == _OK:
+                    future.set_result(body)
+                else:
+                    future.set_exception(ServerError(body.decode()))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            for future in self.__pending.values():
+                future.set_exception(ConnectionError(
+                    'The connection is closed.'))
+            self.__pending.clear()
+
+
+class SyncClient(_Methods):
+    '''A blocking client, each operation waits for its response.'''
+
+    def __init__(self, path: str = None, host: str = None, port: int = None):
+        '''Connect to a server over a unix socket or TCP.
+
+        Args:
+            path: A path of a unix socket.
+            host: A host of the server, when path is not set.
+            port: A port of the server, when path is not set.
+        '''
+        if path is not None:
+            self.__socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.__socket.connect(path)
+        else:
+            self.__socket = socket.create_connection((host, port))
+            self.__socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY,
+                                     1)
+        self.__file = self.__socket.makefile('rb')
+        self.__ids = itertools.count()
+        self._call(_INFO_OP, b'', self._info)
+
+    def close(self) -> None:
+        '''Close the connection.'''
+        self.__file.close()
+        self.__socket.close()
+
+    def __enter__(self):
+        '''Use the client as a context manager.'''
+        return self
+
+    def __exit__(self, *args):
+        '''Close the connection when leaving a context.'''
+        self.close()
+
+    def _call(self, operation: int, payload: bytes, parse):
+        '''Send a request and wait for its response.
+
+        Args:
+            operation: An operation code.
+            payload: Arguments of the operation.
+            parse: A function which unpacks a payload of the response.
+
+        Returns:
+            An unpacked response.
+        '''
+        request_id = next(self.__ids) & 0xFFFFFFFF
+        self.__socket.sendall(_HEADER.pack(len(payload), request_id,
+                                           operation) + payload)
+        header = self.__file.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ConnectionError('The connection is closed.')
+        length, _, status = _HEADER.unpack(header)
+        body = self.__file.read(length)
+        if status != _OK:
+            raise ServerError(body.decode())
+        return parse(body)
+
+
+def _pack_str(value: str) -> bytes:
+    '''Pack a string with its length.
+
+    Args:
+        value: A string.
+
+    Returns:
+        Packed bytes.
+    '''
+    encoded = value.encode()
+    return _LENGTH.pack(len(encoded)) + encoded
+
+
+def _unpack_str(payload: bytes, offset: int) -> tuple:
+    '''Unpack a string packed by _pack_str.
+
+    Args:
+        payload: A buffer.
+        offset: Where the string starts.
+
+    Returns:
+        A tuple with the string and an offset after it.
+    '''
+    length = _LENGTH.unpack_from(payload, offset)[0]
+    start = offset + _LENGTH.size
+    return payload[start:start + length].decode(), start + length
+
+
+def _main(args: list = None) -> None:
+    '''Run a server until it's interrupted, with options from the command
+    line. It listens on a unix socket, or on a TCP port if the port is set.
+
+    Args:
+        args: Command line arguments, sys.argv by default.
+    '''
+    parser = argparse.ArgumentParser(
+        description='Run a server which hosts simulation sessions.')
+    parser.add_argument('--data-path', default='data',
+                        help='where csv files with data are stored')
+    parser.add_argument('--path', default='xchg.sock',
+                        help='a path of a unix socket')
+    parser.add_argument('--host', default=None,
+                        help='a host to listen on with a TCP port')
+    parser.add_argument('--port', type=int, default=None,
+                        help='a TCP port to listen on instead of a unix '
+                             'socket')
+    parser.add_argument('--fee', type=float, default=0.002,
+                        help='a trading fee')
+    parser.add_argument('--min-order-size', type=float, default=0.0001,
+                        help='a minimum order size in a cash currency')
+    options = parser.parse_args(args)
+
+    async def serve():
+        server = Server(options.fee, options.min_order_size,
+                        data_path=options.data_path)
+        if options.port is None:
+            await server.start(path=options.path)
+        else:
+            await server.start(host=options.host, port=options.port)
+        await server.serve_forever()
+
+    asyncio.run(serve())
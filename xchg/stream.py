@@ -0,0 +1,246 @@
+'''Streaming source of candles for datasets which do not fit in memory.'''
+
+import csv
+import heapq
+from collections import deque
+from operator import itemgetter
+from os import path
+from os import listdir
+import numpy as np
+from .common import _fill_missing
+
+
+class CandleStream:
+    def __init__(self, data_path: str, buffer_size: int = 1024):
+        '''Open csv files with candles for reading in lockstep.
+
+        Only a bounded number of candles is kept in memory, so Xchg instances
+        which use a stream can only go forward with next_step, and candles
+        older than the buffer are not available anymore.
+
+        Files are merged by dates, so they may have gaps or different ranges.
+        Missing candles are filled in the same way as by the loader of csv
+        files, see missing.
+
+        Args:
+            data_path: Where csv files with data are stored.
+            buffer_size: How many candles are kept in memory.
+        '''
+        filenames = sorted(f for f in listdir(data_path)
+                           if path.splitext(f)[1] == '.csv')
+        self.__currencies = [path.splitext(f)[0] for f in filenames]
+        self.__files = [open(path.join(data_path, f), newline='')
+                        for f in filenames]
+        readers = [csv.reader(f) for f in self.__files]
+        headers = [next(reader) for reader in readers]
+        self.__columns = headers[0]
+        self.__index = {currency: i for i, currency
+                        in enumerate(self.__currencies)}
+
+        # Dates of all files are merged once to get the number of candles
+        # and the last date, without keeping them in memory.
+        self.__length = 0
+        self.__last_date = None
+        scans = [open(path.join(data_path, f), newline='') for f in filenames]
+        try:
+            scanners = [csv.reader(f) for f in scans]
+            for reader in scanners:
+                next(reader)
+            dates = [map(float, map(itemgetter(header.index('date')),
+                                    reader))
+                     for header, reader in zip(headers, scanners)]
+            for date in heapq.merge(*dates):
+                if date != self.__last_date:
+                    self.__length += 1
+                    self.__last_date = date
+        finally:
+            for f in scans:
+                f.close()
+
+        order = [[header.index(column) for column in self.__columns]
+                 for header in headers]
+        self.__rows = self.__read(readers, order,
+                                  self.__columns.index('date'),
+                                  self.__columns)
+        self.__buffer = deque(maxlen=buffer_size)
+        self.__buffer_start = 0
+        self.__read_ahead = max(buffer_size // 2, 1)
+
+    @staticmethod
+    def __parse(reader, indexes: list):
+        '''Parse rows of a csv file.
+
+        Args:
+            reader: A csv reader.
+            indexes: Indexes of columns in the file.
+
+        Yields:
+            Lists of values of columns.
+        '''
+        for row in reader:
+            yield [float(row[i]) for i in indexes]
+
+    @staticmethod
+    def __read(readers: list, order: list, date: int, columns: list):
+        '''Read csv files in lockstep with a k-way merge by dates. A file
+        whose next candle is later than the current date repeats its previous
+        candle, or has NaN values if there are no candles before.
+
+        Args:
+            readers: Csv readers, one for each currency.
+            order: Indexes of columns in each file.
+            date: An index of the date column.
+            columns: Names of columns.
+
+        Yields:
+            Tuples with an array with a shape (C, N) and a boolean array of
+            missing candles with a shape (N,), one for each date.
+        '''
+        rows = [CandleStream.__parse(reader, indexes)
+                for reader, indexes in zip(readers, order)]
+        following = [next(file_rows, None) for file_rows in rows]
+        previous = [[np.nan] * len(columns)] * len(rows)
+        heap = [(row[date], i) for i, row in enumerate(following)
+                if row is not None]
+        heapq.heapify(heap)
+        while heap:
+            current = heap[0][0]
+            missing = np.ones(len(rows), dtype=bool)
+            while heap and heap[0][0] == current:
+                i = heapq.heappop(heap)[1]
+                previous[i] = following[i]
+                missing[i] = False
+                following[i] = next(rows[i], None)
+                if following[i] is not None:
+                    heapq.heappush(heap, (following[i][date], i))
+            candle = np.array(previous).T
+            if missing.any():
+                _fill_missing(dict(zip(columns, candle)), missing, current)
+            yield candle, missing
+
+    def __len__(self):
+        '''Returns the number of candles.'''
+        return self.__length
+
+    @property
+    def currencies(self) -> list:
+        '''Get currencies which are streamed.
+
+        Returns:
+            A sorted list of currencies.
+        '''
+        return self.__currencies
+
+    @property
+    def columns(self) -> list:
+        '''Get columns which are streamed.
+
+        Returns:
+            A list of columns.
+        '''
+        return self.__columns
+
+    def index(self, currency: str) -> int:
+        '''Get a position of the currency in rows.
+
+        Args:
+            currency: A name of the currency.
+
+        Returns:
+            An index of the currency.
+        '''
+        return self.__index[currency]
+
+    def close(self) -> None:
+        '''Close csv files.'''
+        for f in self.__files:
+            f.close()
+
+    def __enter__(self):
+        '''Use the stream as a context manager.'''
+        return self
+
+    def __exit__(self, *args):
+        '''Close csv files when leaving a context.'''
+        self.close()
+
+    def __candle(self, position: int) -> np.ndarray:
+        '''Get all values of the candle at the given position, reading more
+        candles from files if needed.
+
+        Args:
+            position: An index of the candle.
+
+        Returns:
+            A tuple with an array with a shape (C, N) and a boolean array of
+            missing candles with a shape (N,).
+        '''
+        if position < self.__buffer_start:
+            raise IndexError(f"Candle {position} is already out of the "
+                             f"buffer, a stream can only go forward.")
+        if position >= self.__length:
+            raise IndexError(f"Candle {position} is out of range.")
+        end = self.__buffer_start + len(self.__buffer)
+        if position >= end:
+            for row in self.__rows:
+                self.__buffer.append(row)
+                end += 1
+                if (end >= position + self.__read_ahead
+                        or end == self.__length):
+                    break
+            self.__buffer_start = end - len(self.__buffer)
+            if end == self.__length:
+                self.close()
+        return self.__buffer[position - self.__buffer_start]
+
+    def row(self, column: str, position: int) -> np.ndarray:
+        '''Get values of a column for all currencies at the given position.
+
+        Args:
+            column: A name of the column.
+            position: An index of the candle.
+
+        Returns:
+            An array with a shape (N,).
+        '''
+        return self.__candle(position)[0][self.__columns.index(column)]
+
+    def missing(self, position: int) -> np.ndarray:
+        '''Get which candles at the given position were missing in files.
+
+        Args:
+            position: An index of the candle.
+
+        Returns:
+            A boolean array with a shape (N,).
+        '''
+        return self.__candle(position)[1]
+
+    def date(self, position: int) -> float:
+        '''Get a date of the candle at the given position. The last date is
+        always available.
+
+        Args:
+            position: An index of the candle.
+
+        Returns:
+            A date of the first currency.
+        '''
+        if position == self.__length - 1:
+            return self.__last_date
+        return self.row('date', position)[0].item()
+
+    def candle(self, position: int) -> dict:
+        '''Build a candle at the given position as a dictionary.
+
+        Args:
+            position: An index of the candle.
+
+        Returns:
+            A dictionary where keys are currencies and values are
+            dictionaries of columns.
+        '''
+        rows = self.__candle(position)[0].tolist()
+        return {currency: {column: rows[j][i] for j, column
+                           in enumerate(self.__columns)}
+                for i, currency in enumerate(self.__currencies)}
@@ -0,0 +1,153 @@
+'''Parallel runs of a strategy with different parameters on the same data.'''
+
+import itertools
+import numpy as np
+from multiprocessing import Pool
+from multiprocessing import shared_memory
+from time import perf_counter
+from .candles import Candles
+from .common import _read_candles
+from .xchg import Xchg
+
+# State of a worker process, it's set by _init_worker.
+_worker = {}
+
+
+def sweep(strategy, grid, fee: float, min_order_size: float,
+          data_path: str = None, candles: Candles = None, balance=None,
+          processes: int = None, columns: list = None,
+          dtype=np.float64) -> list:
+    '''Run a strategy for every combination of parameters in a pool of
+    processes. Candles are loaded once and shared between processes through
+    a shared memory, so workers do not copy them. Each column is shared with
+    its own dtype.
+
+    Args:
+        strategy: A function which takes a Xchg instance and parameters as
+            keyword arguments and returns a final Xchg instance. It must be
+            defined at the top level of a module to be sent to workers.
+        grid: A dictionary where keys are parameter names and values are lists
+            of values to try, or a list of dictionaries with parameters.
+        fee: A trading fee.
+        min_order_size: A minimum order size.
+        data_path: Where csv files with data are stored.
+        candles: A candles store, it's used when data_path is not set.
+        balance: An initial balance, the same as in Xchg.
+        processes: A number of worker processes, all cores by default.
+        columns: Columns to load from csv files, all by default, like in
+            Xchg.
+        dtype: A data type of loaded values, like in Xchg.
+
+    Returns:
+        A list of dictionaries with parameters, a final capital, a profit
+        relative to the initial capital, a final balance and a running time
+        in seconds for each run, in the order of the grid.
+    '''
+    if data_path is not None:
+        candles = _read_candles(data_path, columns=columns, dtype=dtype)
+    if isinstance(grid, dict):
+        names = list(grid.keys())
+        grid = [dict(zip(names, values))
+                for values in itertools.product(*grid.values())]
+
+    blocks = []
+    try:
+        specs = {}
+        for column in candles.columns:
+            shm, specs[column] = _share(candles.column(column))
+            blocks.append(shm)
+
+        # Flags of missing candles are shared too, so workers reject orders
+        # at them in the same way.
+        missing = candles.missing(slice(None))
+        missing_spec = None
+        if missing.ndim == 2:
+            missing_shm, missing_spec = _share(missing)
+            blocks.append(missing_shm)
+
+        init_args = (specs, candles.currencies, fee, min_order_size, balance,
+                     missing_spec)
+        with Pool(processes, initializer=_init_worker,
+                  initargs=init_args) as pool:
+            return pool.map(_run, [(strategy, params) for params in grid])
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _share(array: np.ndarray) -> tuple:
+    '''Copy an array into a new shared memory block.
+
+    Args:
+        array: An array to share.
+
+    Returns:
+        A tuple with the shared memory block and a tuple with its name, a
+        shape and a dtype of the array, which is passed to _attach.
+    '''
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach(spec: tuple) -> tuple:
+    '''Attach to an array in a shared memory block.
+
+    Args:
+        spec: A name of the block, a shape and a dtype of the array, see
+            _share.
+
+    Returns:
+        A tuple with the shared memory block and the array.
+    '''
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _init_worker(columns: dict, currencies: list, fee: float,
+                 min_order_size: float, balance,
+                 missing: tuple = None) -> None:
+    '''Attach a worker process to candles in a shared memory.
+
+    Args:
+        columns: A dictionary where keys are columns and values are shared
+            arrays with a shape (T, N), see _share.
+        currencies: A sorted list of currencies.
+        fee: A trading fee.
+        min_order_size: A minimum order size.
+        balance: An initial balance.
+        missing: A shared array of missing candles, see _share, or None.
+    '''
+    _worker['shm'] = []
+    data = {}
+    for column, spec in columns.items():
+        shm, data[column] = _attach(spec)
+        _worker['shm'].append(shm)
+    if missing is not None:
+        missing_shm, missing = _attach(missing)
+        _worker['shm'].append(missing_shm)
+    candles = Candles(currencies, list(columns), data, missing)
+    _worker['xchg'] = Xchg(fee, min_order_size, balance=balance,
+                           candles=candles)
+
+
+def _run(task: tuple) -> dict:
+    '''Run a strategy once in a worker process.
+
+    Args:
+        task: A strategy and its parameters.
+
+    Returns:
+        Statistics of the run.
+    '''
+    strategy, params = task
+    x = _worker['xchg']
+    start = perf_counter()
+    result = strategy(x, **params)
+    return {'params': params,
+            'capital': result.capital,
+            'profit': result.capital / x.capital - 1,
+            'balance': dict(result.balance),
+            'time': perf_counter() - start}
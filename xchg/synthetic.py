@@ -0,0 +1,117 @@
+'''Generators of synthetic market data for tests and benchmarks.'''
+
+import os
+import numpy as np
+from .candles import Candles
+
+# The same columns as in files saved by download_candles.
+COLUMNS = ['date', 'high', 'low', 'open', 'close', 'volume', 'quoteVolume',
+           'weightedAverage']
+
+
+def synthetic_candles(candles_number: int, currencies_number: int,
+                      period: int = 1800, start: int = 1575158400,
+                      seed: int = None) -> Candles:
+    '''Generate candles where close prices follow a geometric random walk.
+
+    Args:
+        candles_number: A number of candles.
+        currencies_number: A number of currencies.
+        period: Period for one candle in seconds.
+        start: A date of the first candle (UNIX timestamp).
+        seed: A seed for a random generator.
+
+    Returns:
+        A columnar store of candles.
+    '''
+    rng = np.random.default_rng(seed)
+    currencies = _currencies(currencies_number)
+    data = _generate(rng, candles_number, currencies_number, period, start,
+                     rng.uniform(0.001, 0.1, currencies_number))
+    return Candles(currencies, COLUMNS, data)
+
+
+def write_synthetic_csv(data_path: str, candles_number: int,
+                        currencies_number: int, period: int = 1800,
+                        start: int = 1575158400, seed: int = None,
+                        chunk_size: int = 100000) -> None:
+    '''Generate candles like synthetic_candles and save them into csv files,
+    one file for each currency. Candles are generated in chunks, so memory
+    does not depend on the number of candles.
+
+    Args:
+        data_path: Where to save csv files.
+        candles_number: A number of candles.
+        currencies_number: A number of currencies.
+        period: Period for one candle in seconds.
+        start: A date of the first candle (UNIX timestamp).
+        seed: A seed for a random generator.
+        chunk_size: How many candles are generated at once.
+    '''
+    rng = np.random.default_rng(seed)
+    os.makedirs(data_path, exist_ok=True)
+    files = [open(os.path.join(data_path, f"{currency}.csv"), 'w')
+             for currency in _currencies(currencies_number)]
+    try:
+        for f in files:
+            f.write(','.join(COLUMNS) + '\n')
+        close = rng.uniform(0.001, 0.1, currencies_number)
+        for first in range(0, candles_number, chunk_size):
+            size = min(chunk_size, candles_number - first)
+            data = _generate(rng, size, currencies_number, period,
+                             start + first * period, close)
+            close = data['close'][-1]
+            for i, f in enumerate(files):
+                values = np.column_stack([data[c][:, i] for c in COLUMNS])
+                np.savetxt(f, values, delimiter=',',
+                           fmt=['%d'] + ['%.8f'] * (len(COLUMNS) - 1))
+    finally:
+        for f in files:
+            f.close()
+
+
+def _currencies(currencies_number: int) -> list:
+    '''Get names of synthetic currencies, which are sorted like filenames.
+
+    Args:
+        currencies_number: A number of currencies.
+
+    Returns:
+        A sorted list of currencies.
+    '''
+    width = len(str(currencies_number - 1))
+    return [f"cur{i:0{width}d}" for i in range(currencies_number)]
+
+
+def _generate(rng: np.random.Generator, candles_number: int,
+              currencies_number: int, period: int, start: int,
+              close: np.ndarray) -> dict:
+    '''Generate columns of candles which continue the given close prices.
+
+    Args:
+        rng: A random generator.
+        candles_number: A number of candles.
+        currencies_number: A number of currencies.
+        period: Period for one candle in seconds.
+        start: A date of the first candle (UNIX timestamp).
+        close: Close prices before the first candle.
+
+    Returns:
+        A dictionary where keys are columns and values are arrays with a shape
+        (candles_number, currencies_number).
+    '''
+    shape = (candles_number, currencies_number)
+    returns = rng.normal(0, 0.01, shape)
+    data = {}
+    dates = start + period * np.arange(candles_number, dtype=np.float64)
+    data['date'] = np.repeat(dates[:, None], currencies_number, axis=1)
+    data['close'] = close * np.exp(np.cumsum(returns, axis=0))
+    data['open'] = np.vstack((close, data['close'][:-1]))
+    data['high'] = np.maximum(data['open'], data['close']) \
+        * (1 + np.abs(rng.normal(0, 0.005, shape)))
+    data['low'] = np.minimum(data['open'], data['close']) \
+        * (1 - np.abs(rng.normal(0, 0.005, shape)))
+    data['weightedAverage'] = (data['high'] + data['low']) / 2
+    data['volume'] = rng.lognormal(0, 1, shape)
+    data['quoteVolume'] = data['volume'] / data['weightedAverage']
+    return data
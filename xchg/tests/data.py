@@ -1,6 +1,11 @@
 '''Test data.'''
 
-import pandas as pd
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
 from pytest import fixture
 from ..xchg import Xchg
 
@@ -88,41 +93,13 @@ def downloaded_candles() -> list:
 
 
 @fixture
-def dataframe() -> pd.core.frame.DataFrame:
-    '''Two candles in the DataFrame.'''
-    candles = list([
-        [
-            1575158400,
-            0.02009497,
-            0.020021,
-            0.02007299,
-            0.02008,
-            2.83754783,
-            141.51364588,
-            0.0200514
-        ],
-        [
-            1575160200,
-            0.02014813,
-            0.02007299,
-            0.02008427,
-            0.02012469,
-            0.15556988,
-            7.73633777,
-            0.02010898
-        ]
-    ])
-    columns = list([
-        'date',
-        'high',
-        'low',
-        'open',
-        'close',
-        'volume',
-        'quoteVolume',
-        'weightedAverage'
-    ])
-    return pd.DataFrame(candles, columns=columns)
+def gap_files() -> dict:
+    '''Csv files with different dates: cur1 starts later and cur2 has a
+    gap.'''
+    header = 'date,open,close,volume\n'
+    return {'cur0.csv': header + '0,1,2,10\n1800,2,3,11\n3600,3,4,12',
+            'cur1.csv': header + '1800,5,6,13\n3600,6,7,14',
+            'cur2.csv': header + '0,8,9,15\n3600,9,10,16'}
 
 
 @fixture
@@ -243,3 +220,60 @@ def xchg_repr() -> str:
             "lenght: 2\n"
             "data_start: 1575158400.0\n"
             "data_end: 1575160200.0")
+
+
+def chart_data(pair: str, period: int, start: int, end: int) -> list:
+    '''Generate candles like Poloniex returns them.
+
+    Args:
+        pair: A currency pair, for example 'BTC_ETH'.
+        period: Period for one candle in seconds.
+        start: Start of the range (UNIX timestamp).
+        end: End of the range (UNIX timestamp).
+
+    Returns:
+        A list of candles.
+    '''
+    first = -(-start // period) * period
+    dates = range(first, end + 1, period)
+    return [{'date': date,
+             'high': 0.02,
+             'low': 0.01,
+             'open': 0.015,
+             'close': date / 1e11,
+             'volume': 1.0,
+             'quoteVolume': 2.0,
+             'weightedAverage': 0.016} for date in dates]
+
+
+@fixture
+def chart_server() -> str:
+    '''A local stand-in for the public API of Poloniex which serves
+    returnChartData generated by chart_data.
+
+    Yields:
+        An address of the public API.
+    '''
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = {k: v[0] for k, v
+                     in parse_qs(urlparse(self.path).query).items()}
+            body = json.dumps(chart_data(query['currencyPair'],
+                                         int(query['period']),
+                                         int(query['start']),
+                                         int(query['end']))).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/public"
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,49 @@
+'''Unit tests for candles.py.'''
+
+from pytest import approx
+from ..candles import Candles
+from ..synthetic import synthetic_candles
+
+
+def test_from_list(candles: list):
+    '''Test a conversion of a candles list into a columnar store.
+
+    Args:
+        candles: A candles list.
+    '''
+    store = Candles.from_list(candles)
+    assert store.currencies == ['cur0', 'cur1', 'cur2']
+    assert store.columns == ['date', 'high', 'low', 'open', 'close']
+    assert len(store) == 2
+    assert store.column('close').shape == (2, 3)
+    assert store.column('close')[1, store.index('cur1')] == 0.120124
+    assert store.candle(0) == candles[0]
+    assert store.candle(1) == candles[1]
+
+
+def test_rollup():
+    '''Test aggregation of candles into a longer period.'''
+    store = synthetic_candles(10, 2, period=1800, start=1575158400 + 1800,
+                              seed=0)
+    rollup = store.rollup(7200)
+    assert store.rollup(7200) is rollup
+    assert len(rollup) == 3
+    assert rollup.column('date')[:, 0].tolist() == \
+        [1575158400, 1575158400 + 7200, 1575158400 + 14400]
+
+    # Candles 0-2, 3-6 and 7-9 fall into the coarse candles.
+    groups = [slice(0, 3), slice(3, 7), slice(7, 10)]
+    for i, group in enumerate(groups):
+        assert list(rollup.row('open', i)) == \
+            list(store.column('open')[group][0])
+        assert list(rollup.row('close', i)) == \
+            list(store.column('close')[group][-1])
+        assert list(rollup.row('high', i)) == \
+            list(store.column('high')[group].max(axis=0))
+        assert list(rollup.row('low', i)) == \
+            list(store.column('low')[group].min(axis=0))
+        assert rollup.row('volume', i) == \
+            approx(store.column('volume')[group].sum(axis=0))
+        assert rollup.row('weightedAverage', i) == \
+            approx(store.column('volume')[group].sum(axis=0)
+                   / store.column('quoteVolume')[group].sum(axis=0))
@@ -1,5 +1,9 @@
 '''Unit tests for common.py.'''
 
+import os
+import numpy as np
+from pytest import raises
+from .. import common
 from ..common import _read_candles
 
 
@@ -20,5 +24,157 @@ def test_read_candles(files: dict, tmp_path: str, candles: list):
     currencies = sorted([f.split('.')[0] for f in files])
 
     # Compare results.
-    assert _read_candles(tmp_path)['currencies'] == currencies
-    assert _read_candles(tmp_path)['candles'] == candles
+    store = _read_candles(tmp_path)
+    assert store.currencies == currencies
+    assert len(store) == len(candles)
+    assert [store.candle(i) for i in range(len(store))] == candles
+
+
+def test_read_candles_cache(files: dict, tmp_path: str, candles: list):
+    '''Test that parsed candles are cached and the cache is rebuilt after a
+    csv file is changed.
+
+    Args:
+        files: A dictionary with csv files content.
+        tmp_path: A path which authomatically created by pytest for testing.
+        candles: An expected result.
+    '''
+    for filename, content in files.items():
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content)
+
+    _read_candles(tmp_path)
+    assert os.path.exists(tmp_path / '.xchg_cache' / 'meta.json')
+
+    # Cached candles are memory-mapped.
+    store = _read_candles(tmp_path)
+    assert isinstance(store.column('close'), np.memmap)
+    assert [store.candle(i) for i in range(len(store))] == candles
+
+    # Drop the last candle and check that the cache is rebuilt.
+    for filename, content in files.items():
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content.rsplit('\n', 1)[0])
+    store = _read_candles(tmp_path)
+    assert [store.candle(i) for i in range(len(store))] == candles[:1]
+
+    # The cache can be disabled.
+    store = _read_candles(tmp_path, cache=False)
+    assert not isinstance(store.column('close'), np.memmap)
+
+
+def test_read_candles_parallel(files: dict, tmp_path: str, candles: list,
+                               monkeypatch):
+    '''Test parsing of csv files by a pool of processes, and parsing of files
+    with quoted values.
+
+    Args:
+        files: A dictionary with csv files content.
+        tmp_path: A path which authomatically created by pytest for testing.
+        candles: An expected result.
+        monkeypatch: A pytest fixture which patches attributes.
+    '''
+    for i, (filename, content) in enumerate(files.items()):
+        if i == 0:
+            # Quote values, so numpy can't parse them.
+            header, *rows = content.split('\n')
+            content = '\n'.join([header] + [
+                ','.join(f'"{value}"' for value in row.split(','))
+                for row in rows])
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content)
+
+    monkeypatch.setattr(common, '_PARALLEL_SIZE', 0)
+    store = _read_candles(tmp_path, cache=False, processes=2)
+    assert [store.candle(i) for i in range(len(store))] == candles
+
+
+def test_read_candles_columns(files: dict, tmp_path: str, candles: list):
+    '''Test loading of selected columns with a given dtype, and growing of
+    the cache when more columns are requested.
+
+    Args:
+        files: A dictionary with csv files content.
+        tmp_path: A path which authomatically created by pytest for testing.
+        candles: An expected result.
+    '''
+    for filename, content in files.items():
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content)
+
+    store = _read_candles(tmp_path, columns=['open'], dtype=np.float32)
+    assert store.columns == ['date', 'open', 'close']
+    assert store.column('date').dtype == np.float64
+    assert store.column('close').dtype == np.float32
+    assert store.candle(1)['cur1']['close'] == \
+        float(np.float32(candles[1]['cur1']['close']))
+
+    # Cached columns are memory-mapped, and the high column is parsed and
+    # added to the cache.
+    store = _read_candles(tmp_path, columns=['high'], dtype=np.float32)
+    assert not isinstance(store.column('high'), np.memmap)
+    assert isinstance(store.column('close'), np.memmap)
+    store = _read_candles(tmp_path, columns=['high', 'open'],
+                          dtype=np.float32)
+    assert all(isinstance(store.column(column), np.memmap)
+               for column in store.columns)
+
+    # Float64 columns are cached separately.
+    store = _read_candles(tmp_path)
+    assert [store.candle(i) for i in range(len(store))] == candles
+    assert not isinstance(store.column('close'), np.memmap)
+    store = _read_candles(tmp_path)
+    assert isinstance(store.column('close'), np.memmap)
+
+    with raises(ValueError):
+        _read_candles(tmp_path, columns=['unknown'])
+
+
+def test_read_candles_gaps(gap_files: dict, tmp_path: str):
+    '''Test alignment of files with different dates.
+
+    Args:
+        gap_files: A dictionary with csv files content.
+        tmp_path: A path which authomatically created by pytest for testing.
+    '''
+    for filename, content in gap_files.items():
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content)
+
+    for _ in range(2):
+        store = _read_candles(tmp_path)
+        assert len(store) == 3
+        assert store.column('date').tolist() == \
+            [[0, 0, 0], [1800, 1800, 1800], [3600, 3600, 3600]]
+        # cur1 has no prices before its first candle and cur2 repeats the
+        # previous close price.
+        np.testing.assert_array_equal(store.column('close'),
+                                      [[2, np.nan, 9], [3, 6, 9], [4, 7, 10]])
+        np.testing.assert_array_equal(store.column('open'),
+                                      [[1, np.nan, 8], [2, 5, 9], [3, 6, 9]])
+        assert store.column('volume').tolist() == \
+            [[10, 0, 15], [11, 13, 0], [12, 14, 16]]
+        assert store.missing(0).tolist() == [False, True, False]
+        assert store.missing(1).tolist() == [False, False, True]
+        assert store.missing(2).tolist() == [False, False, False]
+
+    # Only the missing column is parsed when the rest is cached.
+    store = _read_candles(tmp_path, columns=['volume'], dtype=np.float32)
+    store = _read_candles(tmp_path, columns=['volume', 'open'],
+                          dtype=np.float32)
+    np.testing.assert_array_equal(store.column('open'),
+                                  [[1, np.nan, 8], [2, 5, 9], [3, 6, 9]])
+    assert store.missing(0).tolist() == [False, True, False]
+
+
+def test_parse_file_quoted(tmp_path: str):
+    '''Test parsing of a file which numpy can't parse, with quoted values, a
+    text column and a blank line.
+
+    Args:
+        tmp_path: A path which authomatically created by pytest for testing.
+    '''
+    with open(tmp_path / 'cur0.csv', 'w') as f:
+        f.write('date,pair,close\n0,"BTC_ETH","2.5"\n1800,"BTC_ETH","3"\n\n')
+    values = common._parse_file(tmp_path / 'cur0.csv', ['date', 'close'])
+    assert values.tolist() == [[0, 2.5], [1800, 3]]
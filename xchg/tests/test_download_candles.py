@@ -1,25 +1,15 @@
 '''Unit tests for download_candles.py.'''
 
 import os
-import pandas as pd
+from .data import chart_data
+from ..download_candles import _chunks
+from ..download_candles import _client
+from ..download_candles import _download
+from ..download_candles import _last_date
 from ..download_candles import _request
-from ..download_candles import _candles_to_df
 from ..download_candles import _main
 
 
-def test_candles_to_df(downloaded_candles: list,
-                       dataframe: pd.core.frame.DataFrame):
-    '''Test conversion from candles to a Pandas DataFrame.
-
-    Args:
-        downloaded_candles: Test candles in a list.
-        dataframe: Pandas DataFrame with test candles.
-    '''
-    downloaded_df = _candles_to_df(downloaded_candles)
-    pd.testing.assert_frame_equal(downloaded_df, dataframe,
-                                  check_exact=True)
-
-
 def test_request(downloaded_candles: list):
     '''Test request to Poloniex.
 
@@ -40,3 +30,82 @@ def test_main(tmp_path: str):
     _main(data_folder=path)
     currencies = {'ETH.csv', 'ETC.csv', 'XMR.csv', 'LTC.csv'}
     assert set(os.listdir(path)) == currencies
+
+
+def test_chunks():
+    '''Test splitting a range into chunks.'''
+    assert _chunks(0, 9000, 1800, 2) == [(0, 3599), (3600, 7199),
+                                         (7200, 9000)]
+    assert _chunks(0, 1800, 1800, 10) == [(0, 1800)]
+
+
+def test_download():
+    '''Test concurrent download of chunks with a custom fetch function.'''
+    calls = []
+
+    def fetch(currency, period, start, end):
+        calls.append((currency, start, end))
+        return chart_data(f"BTC_{currency}", period, start, end)
+
+    ranges = {'ETH': (0, 18000), 'LTC': (9000, 18000)}
+    downloaded = {}
+    for currency, candles in _download(ranges, 1800, fetch=fetch, workers=4,
+                                       chunk_size=3):
+        downloaded.setdefault(currency, []).extend(candles)
+    assert len(calls) == 6
+    assert downloaded['ETH'] == chart_data('', 1800, 0, 18000)
+    assert downloaded['LTC'] == chart_data('', 1800, 9000, 18000)
+
+
+def test_resume(tmp_path: str):
+    '''Test that downloads continue existing files.
+
+    Args:
+        tmp_path: Path which authomatically created by pytest for testing.
+    '''
+    calls = []
+
+    def fetch(currency, period, start, end):
+        calls.append((currency, start, end))
+        return chart_data(f"BTC_{currency}", period, start, end)
+
+    _main(['ETH'], 0, 9000, 1800, tmp_path, fetch=fetch)
+    assert _last_date(tmp_path / 'ETH.csv') == 9000
+
+    # Simulate an interrupted write of the last line.
+    with open(tmp_path / 'ETH.csv', 'a') as f:
+        f.write('10800,0.02,0.0')
+    assert _last_date(tmp_path / 'ETH.csv') == 9000
+
+    calls.clear()
+    _main(['ETH'], 0, 18000, 1800, tmp_path, fetch=fetch)
+    assert calls == [('ETH', 10800, 18000)]
+    with open(tmp_path / 'ETH.csv') as f:
+        dates = [int(line.split(',')[0]) for line in f.readlines()[1:]]
+    assert dates == list(range(0, 18001, 1800))
+
+    # Nothing is downloaded when files are up to date.
+    calls.clear()
+    _main(['ETH'], 0, 18000, 1800, tmp_path, fetch=fetch)
+    assert calls == []
+    assert _last_date(tmp_path / 'missing.csv') is None
+
+
+def test_client(chart_server: str, tmp_path: str):
+    '''Test a shared client against a local stand-in server.
+
+    Args:
+        chart_server: An address of the stand-in server.
+        tmp_path: Path which authomatically created by pytest for testing.
+    '''
+    client = _client(chart_server, rate_limit=100)
+    assert _request('ETH', 1800, 0, 3600, client) == \
+        chart_data('BTC_ETH', 1800, 0, 3600)
+
+    def fetch(currency, period, start, end):
+        return _request(currency, period, start, end, client)
+
+    path = tmp_path / 'sample_data'
+    _main(['ETH', 'LTC'], 0, 36000, 1800, path, fetch=fetch)
+    assert set(os.listdir(path)) == {'ETH.csv', 'LTC.csv'}
+    assert _last_date(path / 'ETH.csv') == 36000
@@ -0,0 +1,50 @@
+'''Unit tests for features.py.'''
+
+import numpy as np
+from pytest import approx
+from pytest import raises
+from ..synthetic import synthetic_candles
+from ..xchg import Xchg
+
+
+def test_features():
+    '''Test indicators against straightforward loops.'''
+    store = synthetic_candles(600, 3, seed=0)
+    close = store.column('close')
+    volume = store.column('volume')
+
+    sma = store.features('sma', window=5)
+    assert np.isnan(sma[:4]).all()
+    assert sma[4:] == approx(np.array([close[t - 4:t + 1].mean(axis=0)
+                                       for t in range(4, 600)]))
+
+    expected = [close[0]]
+    for row in close[1:]:
+        expected.append(0.1 * row + 0.9 * expected[-1])
+    assert store.features('ema', span=19) == approx(np.array(expected))
+
+    returns = store.features('returns', period=2)
+    assert returns[2:] == approx(close[2:] / close[:-2] - 1)
+
+    log_returns = np.diff(np.log(close), axis=0)
+    assert store.features('volatility', window=10)[10:] == approx(np.array(
+        [log_returns[t - 10:t].std(axis=0, ddof=1)
+         for t in range(10, 600)]))
+
+    assert store.features('volume_ratio', window=3)[2:] == approx(
+        volume[2:] / np.array([volume[t - 2:t + 1].mean(axis=0)
+                               for t in range(2, 600)]))
+
+    # Indicators are cached by names and parameters.
+    assert store.features('sma', window=5) is sma
+    assert store.features('sma', window=6) is not sma
+    with raises(KeyError):
+        store.features('unknown')
+
+
+def test_xchg_feature():
+    '''Test values of indicators at the current candle.'''
+    store = synthetic_candles(10, 2, seed=0)
+    x = Xchg(0.1, 0.01, candles=store).next_step().next_step()
+    assert list(x.feature('sma', window=2)) == \
+        list(store.features('sma', window=2)[2])
@@ -0,0 +1,58 @@
+'''Unit tests for instrumentation.py.'''
+
+from .. import instrumentation
+from ..common import _read_candles
+from ..xchg import Xchg
+
+
+def test_instrumentation(x: Xchg, files: dict, tmp_path: str,
+                         target_portfolios: dict):
+    '''Test counters, timings and hooks.
+
+    Args:
+        x: A Xchg instance.
+        files: A dictionary with csv files content.
+        tmp_path: A path which authomatically created by pytest for testing.
+        target_portfolios: Several test cases for a desired portfolio.
+    '''
+    for filename, content in files.items():
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content)
+
+    # Nothing is collected when instrumentation is disabled.
+    instrumentation.reset()
+    x.buy('cur0', 10).next_step()
+    assert instrumentation.counters() == {}
+    assert instrumentation.timings() == {}
+
+    events = []
+    hook = lambda event, data: events.append((event, data))  # noqa: E731
+    instrumentation.subscribe(hook)
+    instrumentation.enable()
+    try:
+        x.buy('cur0', 10)
+        x.buy('cur0', 0.1)
+        x.buy('cur0', 100)
+        x.sell('cur1', 1)
+        x.make_portfolio(target_portfolios[0]).next_step()
+        _read_candles(tmp_path)
+    finally:
+        instrumentation.disable()
+        instrumentation.unsubscribe(hook)
+
+    counters = instrumentation.counters()
+    assert counters['orders_executed'] == 4
+    assert counters['orders_rejected_min_order_size'] == 1
+    assert counters['orders_rejected_insufficient_balance'] == 2
+    assert counters['rebalances'] == 1
+    assert counters['solver_iterations'] >= 1
+
+    timings = instrumentation.timings()
+    assert set(timings) == {'next_step', 'make_portfolio', 'load'}
+    assert timings['next_step']['count'] == 1
+    assert sum(timings['load']['buckets'].values()) == 1
+
+    assert events[0] == ('order', {'currency': 'cur0', 'side': 'buy',
+                                   'amount': 10, 'status': 'executed'})
+    assert [e for e, _ in events].count('order') == 7
+    instrumentation.reset()
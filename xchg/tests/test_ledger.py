@@ -0,0 +1,57 @@
+'''Unit tests for ledger.py.'''
+
+from pytest import approx
+from ..ledger import BUY
+from ..ledger import Ledger
+from ..ledger import SELL
+from ..xchg import Xchg
+
+
+def test_ledger():
+    '''Test recording and exporting of trades.'''
+    ledger = Ledger()
+    ledger.append(0, 1, BUY, 2.0, 3.0, 0.1)
+    ledger.extend(5, [0, 2], [SELL, BUY], [1.0, 4.0], [2.0, 5.0],
+                  [0.2, 0.3])
+    assert len(ledger) == 3
+    trades = ledger.arrays()
+    assert trades['position'].tolist() == [0, 5, 5]
+    assert trades['currency'].tolist() == [1, 0, 2]
+    assert trades['side'].tolist() == [BUY, SELL, BUY]
+    assert trades['amount'].tolist() == [2.0, 1.0, 4.0]
+    assert trades['price'].tolist() == [3.0, 2.0, 5.0]
+    assert trades['fee'].tolist() == [0.1, 0.2, 0.3]
+    ledger.clear()
+    assert len(ledger) == 0
+    assert len(ledger.arrays()['amount']) == 0
+
+
+def test_xchg_ledger(candles: list, balance: dict):
+    '''Test that Xchg records executed trades.
+
+    Args:
+        candles: A candles list.
+        balance: An initial balance.
+    '''
+    x = Xchg(0.1, 0.01, balance=balance, candles=candles, ledger=Ledger())
+    assert Xchg(0.1, 0.01, balance=balance, candles=candles).ledger is None
+    x = x.buy('cur0', 10).next_step().sell('cur1', 0.3).sell('cur1', 1000)
+    trades = x.ledger.arrays()
+    assert trades['position'].tolist() == [0, 1]
+    assert trades['currency'].tolist() == [0, 1]
+    assert trades['side'].tolist() == [BUY, SELL]
+    assert trades['amount'].tolist() == [10, 0.3]
+    assert trades['price'].tolist() == [candles[0]['cur0']['close'],
+                                        candles[1]['cur1']['close']]
+    assert trades['fee'].tolist() == approx(
+        [10 * candles[0]['cur0']['close'] * 0.1,
+         0.3 * candles[1]['cur1']['close'] * 0.1])
+
+    # Fees of make_portfolio are the difference between the capitals.
+    x.ledger.clear()
+    before = x.capital
+    x = x.make_portfolio({'cash': 0.5, 'cur0': 0.2, 'cur1': 0.1,
+                          'cur2': 0.2})
+    trades = x.ledger.arrays()
+    assert len(trades['amount']) == 3
+    assert trades['fee'].sum() == approx(before - x.capital, 1e-10)
@@ -0,0 +1,51 @@
+'''Unit tests for sampler.py.'''
+
+from pytest import raises
+from ..sampler import EpisodeSampler
+from ..synthetic import synthetic_candles
+from ..xchg import Xchg
+
+
+def test_window(candles: list, balance: dict):
+    '''Test views of a part of the timeline.
+
+    Args:
+        candles: A candles list.
+        balance: An initial balance.
+    '''
+    x = Xchg(0.1, 0.01, balance=balance, candles=candles)
+    w = x.window(1, 2)
+    assert len(w) == 1
+    assert w.current_candle == candles[1]
+    assert w.data_start == candles[1]['cur0']['date']
+    assert w.data_end == candles[1]['cur0']['date']
+    assert w.balance == x.balance
+    with raises(StopIteration):
+        w.next_step()
+    assert len(x) == len(candles)
+    assert len(x.next_step().window(0)) == len(candles) - 1
+    with raises(IndexError):
+        x.window(0, len(candles) + 1)
+    with raises(IndexError):
+        x.window(1, 1)
+
+    # A window of a mutable exchange does not change it.
+    m = x.mutable()
+    m.window(0, 1).buy('cur0', 1)
+    assert m.balance == x.balance
+
+
+def test_episode_sampler():
+    '''Test that episodes have a fixed length and are reproducible.'''
+    x = Xchg(0.002, 0.0001, candles=synthetic_candles(100, 3, seed=0))
+    sampler = EpisodeSampler(x, 10, rng=1)
+    episodes = [sampler.sample() for _ in range(20)]
+    assert all(len(e) == 10 for e in episodes)
+    assert all(x.data_start <= e.data_start <= e.data_end <= x.data_end
+               for e in episodes)
+    other = EpisodeSampler(x, 10, rng=1)
+    assert [e.data_start for e in episodes] \
+        == [next(iter(other)).data_start for _ in range(20)]
+    assert len(sampler.starts(5)) == 5
+    with raises(ValueError):
+        EpisodeSampler(x, 101)
@@ -0,0 +1,92 @@
+'''Unit tests for server.py.'''
+
+import asyncio
+import threading
+from pytest import approx
+from pytest import raises
+from ..server import Client
+from ..server import Server
+from ..server import ServerError
+from ..server import SyncClient
+from ..xchg import Xchg
+
+
+def test_client(tmp_path: str, candles: list, target_portfolios: dict):
+    '''Test pipelined requests of an async client.
+
+    Args:
+        tmp_path: A path which authomatically created by pytest for testing.
+        candles: A candles list.
+        target_portfolios: Several test cases for a desired portfolio.
+    '''
+    path = str(tmp_path / 'xchg.sock')
+    target = target_portfolios[0]
+
+    async def run():
+        server = Server(0.1, 0.01, candles=candles)
+        await server.start(path=path)
+        client = await Client.connect(path=path)
+        assert client.currencies == ['cur0', 'cur1', 'cur2']
+        assert (client.fee, client.min_order_size, client.length) == \
+            (0.1, 0.01, 2)
+
+        state = await client.open_session('a', 2.0)
+        assert (state['position'], state['length']) == (0, 2)
+        assert state['balance'] == {'cash': 2.0, 'cur0': 0.0, 'cur1': 0.0,
+                                    'cur2': 0.0}
+
+        # Requests are sent without waiting and answered in order.
+        states = await asyncio.gather(client.buy('a', 'cur0', 10),
+                                      client.next_step('a'),
+                                      client.make_portfolio('a', target),
+                                      client.open_session('b'))
+        x = Xchg(0.1, 0.01, balance=2.0, candles=candles).buy('cur0', 10)
+        assert states[0]['balance'] == x.balance
+        x = x.next_step().make_portfolio(target)
+        assert states[2]['balance'] == approx(x.balance, 1e-12)
+        assert states[2]['capital'] == approx(x.capital, 1e-12)
+        assert (states[2]['position'], states[2]['date']) == \
+            (1, x.data_start)
+        assert server.sessions['a'].balance == states[2]['balance']
+        assert (await client.state('b'))['position'] == 0
+
+        with raises(ServerError):
+            await client.next_step('a')
+        with raises(ServerError):
+            await client.sell('unknown', 'cur0', 1)
+        await client.close_session('b')
+        assert list(server.sessions) == ['a']
+        await client.close()
+        await server.close()
+
+    asyncio.run(run())
+
+
+def test_sync_client(tmp_path: str, candles: list):
+    '''Test a blocking client.
+
+    Args:
+        tmp_path: A path which authomatically created by pytest for testing.
+        candles: A candles list.
+    '''
+    path = str(tmp_path / 'xchg.sock')
+    server = Server(0.1, 0.01, candles=candles)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(server.start(path=path))
+    thread = threading.Thread(target=loop.run_forever)
+    thread.start()
+    try:
+        with SyncClient(path=path) as client:
+            client.open_session('a')
+            state = client.buy('a', 'cur1', 5)
+            x = Xchg(0.1, 0.01, candles=candles).buy('cur1', 5)
+            assert state['balance'] == x.balance
+            assert client.sell('a', 'cur1', 1)['balance'] == \
+                x.sell('cur1', 1).balance
+            with raises(ServerError):
+                client.next_step('a', 2)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.run_until_complete(server.close())
+        loop.close()
@@ -0,0 +1,62 @@
+'''Unit tests for stream.py.'''
+
+import numpy as np
+from pytest import raises
+from ..common import _read_candles
+from ..stream import CandleStream
+from ..xchg import Xchg
+
+
+def test_stream(files: dict, tmp_path: str, candles: list, balance: dict):
+    '''Test streaming candles through a Xchg instance.
+
+    Args:
+        files: A dictionary with csv files content.
+        tmp_path: A path which authomatically created by pytest for testing.
+        candles: An expected result.
+        balance: An initial balance.
+    '''
+    for filename, content in files.items():
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content)
+
+    with CandleStream(tmp_path, buffer_size=1) as stream:
+        assert stream.currencies == ['cur0', 'cur1', 'cur2']
+        assert len(stream) == 2
+        x = Xchg(0.1, 0.01, balance=balance, candles=stream)
+        assert x.current_candle == candles[0]
+        assert x.data_end == candles[1]['cur0']['date']
+        assert x.buy('cur0', 10).balance == \
+            Xchg(0.1, 0.01, balance=balance, candles=candles) \
+            .buy('cur0', 10).balance
+
+        x_next = x.next_step()
+        assert x_next.current_candle == candles[1]
+        with raises(StopIteration):
+            x_next.next_step()
+
+        # Old candles are not kept in memory.
+        with raises(IndexError):
+            x.current_candle
+
+
+def test_stream_gaps(gap_files: dict, tmp_path: str):
+    '''Test that a stream aligns files in the same way as the loader.
+
+    Args:
+        gap_files: A dictionary with csv files content.
+        tmp_path: A path which authomatically created by pytest for testing.
+    '''
+    for filename, content in gap_files.items():
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content)
+
+    store = _read_candles(tmp_path, cache=False)
+    with CandleStream(tmp_path, buffer_size=1) as stream:
+        assert len(stream) == 3
+        assert stream.date(2) == 3600
+        for i in range(3):
+            for column in stream.columns:
+                np.testing.assert_array_equal(stream.row(column, i),
+                                              store.row(column, i))
+            assert stream.missing(i).tolist() == store.missing(i).tolist()
@@ -0,0 +1,121 @@
+'''Unit tests for sweep.py.'''
+
+import numpy as np
+from pytest import approx
+from ..candles import Candles
+from ..sweep import _attach
+from ..sweep import _share
+from ..sweep import sweep
+from ..xchg import Xchg
+
+
+def hold(x: Xchg, currency: str, share: float) -> Xchg:
+    '''A test strategy which holds a share of capital in one currency.
+
+    Args:
+        x: A Xchg instance.
+        currency: A currency to hold.
+        share: A share of capital in this currency.
+    '''
+    target_portfolio = {cur: 0.0 for cur in ['cash'] + x.currencies}
+    target_portfolio['cash'] = 1 - share
+    target_portfolio[currency] = share
+    x = x.make_portfolio(target_portfolio)
+    while len(x) > 1:
+        x = x.next_step()
+    return x
+
+
+def sell(x: Xchg, steps: int, amount: float) -> Xchg:
+    '''A test strategy which sells cur2 after a number of steps.
+
+    Args:
+        x: A Xchg instance.
+        steps: How many steps to skip before selling.
+        amount: How much of cur2 to sell.
+    '''
+    return x.next_step(steps).sell('cur2', amount)
+
+
+def test_sweep(candles: list, balance: dict):
+    '''Test a parameter sweep in worker processes.
+
+    Args:
+        candles: A candles list.
+        balance: An initial balance.
+    '''
+    grid = {'currency': ['cur0', 'cur2'], 'share': [0.0, 0.5]}
+    results = sweep(hold, grid, 0.1, 0.01, candles=Candles.from_list(candles),
+                    balance=balance, processes=2)
+
+    assert [r['params'] for r in results] == [
+        {'currency': 'cur0', 'share': 0.0},
+        {'currency': 'cur0', 'share': 0.5},
+        {'currency': 'cur2', 'share': 0.0},
+        {'currency': 'cur2', 'share': 0.5}]
+    for r in results:
+        x = hold(Xchg(0.1, 0.01, balance=balance, candles=candles),
+                 **r['params'])
+        assert r['capital'] == approx(x.capital, 1e-10)
+        assert r['balance'] == approx(x.balance, 1e-10)
+
+
+def test_sweep_missing(gap_files: dict, tmp_path: str):
+    '''Test that workers reject orders at missing candles.
+
+    Args:
+        gap_files: A dictionary with csv files content.
+        tmp_path: A path which authomatically created by pytest for testing.
+    '''
+    for filename, content in gap_files.items():
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content)
+
+    balance = {'cash': 1.0, 'cur2': 1.0}
+    grid = {'steps': [1, 2], 'amount': [0.5]}
+    results = sweep(sell, grid, 0.1, 0.01, data_path=tmp_path,
+                    balance=balance, processes=2)
+    # cur2 has a gap at the second candle.
+    assert results[0]['balance'] == {'cash': 1.0, 'cur0': 0.0, 'cur1': 0.0,
+                                     'cur2': 1.0}
+    for r in results:
+        x = sell(Xchg(0.1, 0.01, data_path=tmp_path, balance=balance),
+                 **r['params'])
+        assert r['balance'] == approx(x.balance, 1e-10)
+
+
+def test_sweep_dtype(files: dict, tmp_path: str, balance: dict):
+    '''Test that selected columns are loaded and shared with their dtype.
+
+    Args:
+        files: A dictionary with csv files content.
+        tmp_path: A path which authomatically created by pytest for testing.
+        balance: An initial balance.
+    '''
+    for filename, content in files.items():
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content)
+
+    grid = {'currency': ['cur0', 'cur1'], 'share': [0.5]}
+    results = sweep(hold, grid, 0.1, 0.01, data_path=tmp_path,
+                    balance=balance, processes=2, columns=[],
+                    dtype=np.float32)
+    for r in results:
+        x = hold(Xchg(0.1, 0.01, data_path=tmp_path, balance=balance,
+                      columns=[], dtype=np.float32), **r['params'])
+        assert r['capital'] == x.capital
+        x = hold(Xchg(0.1, 0.01, data_path=tmp_path, balance=balance),
+                 **r['params'])
+        assert r['capital'] != x.capital
+
+    values = np.arange(6, dtype=np.float32).reshape(2, 3)
+    shm, spec = _share(values)
+    try:
+        attached, shared = _attach(spec)
+        assert shared.dtype == np.float32
+        assert shared.tolist() == values.tolist()
+        del shared
+        attached.close()
+    finally:
+        shm.close()
+        shm.unlink()
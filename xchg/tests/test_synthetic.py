@@ -0,0 +1,34 @@
+'''Unit tests for synthetic.py.'''
+
+import numpy as np
+from ..common import _read_candles
+from ..synthetic import synthetic_candles
+from ..synthetic import write_synthetic_csv
+
+
+def test_synthetic_candles():
+    '''Test generated candles.'''
+    store = synthetic_candles(100, 12, period=60, seed=0)
+    assert store.currencies == sorted(store.currencies)
+    assert len(store.currencies) == 12
+    assert store.column('close').shape == (100, 12)
+    assert (np.diff(store.column('date'), axis=0) == 60).all()
+    assert (store.column('high') >= store.column('close')).all()
+    assert (store.column('low') <= store.column('open')).all()
+    assert (store.column('close') > 0).all()
+
+
+def test_write_synthetic_csv(tmp_path: str):
+    '''Test generated csv files.
+
+    Args:
+        tmp_path: A path which authomatically created by pytest for testing.
+    '''
+    write_synthetic_csv(tmp_path, 25, 3, seed=0, chunk_size=10)
+    store = _read_candles(tmp_path, cache=False)
+    assert store.currencies == ['cur0', 'cur1', 'cur2']
+    assert len(store) == 25
+    assert (np.diff(store.column('date'), axis=0) == 1800).all()
+
+    # Chunks continue each other.
+    assert (store.column('open')[1:] == store.column('close')[:-1]).all()
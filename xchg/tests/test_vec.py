@@ -0,0 +1,104 @@
+'''Unit tests for vec.py.'''
+
+import numpy as np
+from pytest import approx
+from pytest import raises
+from ..synthetic import synthetic_candles
+from ..vec import VecXchg
+from ..xchg import Xchg
+
+
+def balance_array(x: Xchg) -> list:
+    '''Get a balance of a Xchg instance as a list.
+
+    Args:
+        x: A Xchg instance.
+    '''
+    return [x.balance[cur] for cur in ['cash'] + x.currencies]
+
+
+def test_vec_xchg(candles: list, balance: dict, target_portfolios: dict):
+    '''Test that exchanges in lockstep behave like separate Xchg instances.
+
+    Args:
+        candles: A candles list.
+        balance: An initial balance.
+        target_portfolios: Several test cases for a desired portfolio.
+    '''
+    v = VecXchg(0.1, 0.01, balance=balance, candles=candles, envs=3,
+                positions=[0, 0, 1])
+    xs = [Xchg(0.1, 0.01, balance=balance, candles=candles)] * 2 \
+        + [Xchg(0.1, 0.01, balance=balance, candles=candles).next_step()]
+    assert len(v) == 3
+    assert list(v.capital) == approx([x.capital for x in xs], 1e-10)
+
+    # Different amounts in each exchange, the last one is rejected.
+    v_new = v.buy('cur0', [10, 1, 100])
+    expected = [xs[0].buy('cur0', 10), xs[1].buy('cur0', 1),
+                xs[2].buy('cur0', 100)]
+    for row, x in zip(v_new.balances, expected):
+        assert list(row) == approx(balance_array(x), 1e-10)
+
+    v_new = v.sell('cur1', 0.3)
+    for row, x in zip(v_new.balances, xs):
+        assert list(row) == approx(balance_array(x.sell('cur1', 0.3)), 1e-10)
+
+    columns = ['cash'] + v.currencies
+    targets = np.array([[t[cur] for cur in columns]
+                        for t in target_portfolios[:3]])
+    v_new = v.make_portfolio(targets)
+    for row, x, target in zip(v_new.balances, xs, target_portfolios):
+        assert list(row) == \
+            approx(balance_array(x.make_portfolio(target)), 1e-10)
+
+    # The last exchange is at the end of data.
+    assert list(v.done) == [False, False, True]
+    with raises(StopIteration):
+        v.next_step()
+    v_new = v.reset([2]).next_step()
+    assert list(v_new.positions) == [1, 1, 1]
+    assert list(v_new.balances[2]) == [1.0, 0.0, 0.0, 0.0]
+
+
+def test_vec_xchg_long():
+    '''Test many steps of random portfolios on synthetic data.'''
+    store = synthetic_candles(30, 5, seed=0)
+    rng = np.random.default_rng(0)
+    targets = rng.dirichlet(np.ones(6), size=(30, 4))
+    v = VecXchg(0.01, 0.001, candles=store, envs=4)
+    xs = [Xchg(0.01, 0.001, candles=store)] * 4
+    columns = ['cash'] + v.currencies
+    for t in range(30):
+        v = v.make_portfolio(targets[t])
+        xs = [x.make_portfolio(dict(zip(columns, target)))
+              for x, target in zip(xs, targets[t])]
+        if t < 29:
+            v = v.next_step()
+            xs = [x.next_step() for x in xs]
+    assert list(v.capital) == approx([x.capital for x in xs], 1e-10)
+
+
+def test_vec_xchg_missing(gap_files: dict, tmp_path: str):
+    '''Test that exchanges in lockstep don't trade at missing candles.
+
+    Args:
+        gap_files: A dictionary with csv files content.
+        tmp_path: A path which authomatically created by pytest for testing.
+    '''
+    for filename, content in gap_files.items():
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content)
+
+    v = VecXchg(0.1, 0.01, data_path=tmp_path, envs=2, positions=[0, 2])
+    assert v.missing.tolist() == [[False, True, False],
+                                  [False, False, False]]
+    assert list(v.capital) == [1.0, 1.0]
+    v_new = v.buy('cur1', 0.1)
+    assert v_new.balances[0].tolist() == [1.0, 0.0, 0.0, 0.0]
+    assert v_new.balances[1, 2] == approx(0.09, 1e-10)
+    target = [0.2, 0.4, 0.2, 0.2]
+    v_new = v.make_portfolio(target)
+    x = Xchg(0.1, 0.01, data_path=tmp_path)
+    for row, x in zip(v_new.balances, [x, x.next_step(2)]):
+        x = x.make_portfolio(dict(zip(['cash'] + x.currencies, target)))
+        assert list(row) == approx(balance_array(x), 1e-10)
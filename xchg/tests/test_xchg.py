@@ -1,7 +1,11 @@
 '''Unit tests for xchg.py.'''
 
+import pickle
+import numpy as np
 from pytest import raises
 from pytest import approx
+from ..synthetic import synthetic_candles
+from ..xchg import MutableXchg
 from ..xchg import Xchg
 
 
@@ -36,6 +40,7 @@ def test_init(files: dict, tmp_path: str, candles: list, balance: dict,
     assert x.min_order_size == min_order_size
     assert x.currencies == [f.split('.')[0] for f in files.keys()]
     assert repr(x) == xchg_repr
+    assert not hasattr(x, '__dict__')
     x = Xchg(fee, min_order_size, tmp_path)
     assert x.balance == default_balance
     x = Xchg(fee, min_order_size, tmp_path, 1.0)
@@ -57,8 +62,15 @@ def test_next_step(x: Xchg, candles: list):
         x: A Xchg instance.
         candles: A candles list.
     '''
-    x = x.next_step()
-    assert x.current_candle == candles[1]
+    x_next = x.next_step()
+    assert x_next.current_candle == candles[1]
+    assert len(x_next) == len(x) - 1
+    assert x_next.data_start == candles[1]['cur0']['date']
+    assert x_next.data_end == x.data_end
+
+    # The original instance is not affected.
+    assert x.current_candle == candles[0]
+    x = x_next
 
     # Test for an exception at the end of a file.
     with raises(StopIteration):
@@ -155,3 +167,326 @@ def test_make_portfolio(x: Xchg, target_portfolios: dict):
     for target_portfolio in target_portfolios:
         x_new = x_new.make_portfolio(target_portfolio)
         assert x_new.portfolio == approx(target_portfolio, 1e-10)
+
+
+def test_backtest(x: Xchg, target_portfolios: dict):
+    '''Test a vectorized backtest against make_portfolio and next_step.
+
+    Args:
+        x: A Xchg instance.
+        target_portfolios: Several test cases for a desired portfolio.
+    '''
+    columns = ['cash'] + x.currencies
+    for i in range(len(target_portfolios) - 1):
+        weights = [[target_portfolios[j][cur] for cur in columns]
+                   for j in (i, i + 1)]
+        result = x.backtest(weights)
+
+        x_new = x
+        for step, target_portfolio in enumerate(target_portfolios[i:i + 2]):
+            x_new = x_new.make_portfolio(target_portfolio)
+            balance = [x_new.balance[cur] for cur in columns]
+            portfolio = [x_new.portfolio[cur] for cur in columns]
+            assert list(result['balance'][step]) == approx(balance, 1e-10)
+            assert list(result['portfolio'][step]) == approx(portfolio, 1e-10)
+            assert result['capital'][step] == approx(x_new.capital, 1e-10)
+            if step == 0:
+                x_new = x_new.next_step()
+
+    # Orders less than a minimum order size are rejected.
+    x_big = Xchg(0.1, 2.0, balance=x.balance,
+                 candles=[x.current_candle, x.next_step().current_candle])
+    weights = [[target_portfolios[0][cur] for cur in columns]] * 2
+    result = x_big.backtest(weights)
+    assert list(result['balance'][1]) == \
+        approx([x_big.balance[cur] for cur in columns], 1e-10)
+
+    with raises(ValueError):
+        x.backtest(weights * 2)
+
+
+def test_backtest_long():
+    '''Test a long backtest with rejected orders at many steps against
+    make_portfolio and next_step.'''
+    store = synthetic_candles(600, 4, seed=1)
+    rng = np.random.default_rng(1)
+    # Weights change at random steps and stay the same between them, so
+    # there are runs of vectorized steps and runs of rejected orders.
+    weights = rng.dirichlet(np.ones(5), 600)
+    weights[rng.random(600) < 0.9] = np.nan
+    weights[0] = 0.2
+    for t in range(1, 600):
+        if np.isnan(weights[t, 0]):
+            weights[t] = weights[t - 1]
+    for min_order_size in (0.0, 0.002, 0.05):
+        x = Xchg(0.002, min_order_size, candles=store)
+        result = x.backtest(weights)
+        for step in range(600):
+            x = x.make_portfolio(dict(zip(['cash'] + x.currencies,
+                                          weights[step])))
+            assert list(result['balance'][step]) == \
+                approx(list(x.balance.values()), 1e-9)
+            if step < 599:
+                x = x.next_step()
+
+
+def test_make_portfolio_info(x: Xchg, target_portfolios: dict):
+    '''Test information about the make portfolio solver.
+
+    Args:
+        x: A Xchg instance.
+        target_portfolios: Several test cases for a desired portfolio.
+    '''
+    x_new = x
+    for target_portfolio in target_portfolios:
+        x_new, info = x_new.make_portfolio(target_portfolio, info=True)
+        assert x_new.portfolio == approx(target_portfolio, 1e-10)
+        assert 1 <= info['iterations'] <= len(x.currencies) + 1
+        assert info['residual'] < 1e-12
+
+
+def test_mutable(x: Xchg, balance_after_buy: dict, target_portfolios: dict):
+    '''Test a mutable exchange.
+
+    Args:
+        x: A Xchg instance.
+        balance_after_buy: A balance after a buy operation.
+        target_portfolios: Several test cases for a desired portfolio.
+    '''
+    m = x.mutable()
+    assert isinstance(m, MutableXchg)
+    assert m.buy('cur0', 10) is m
+    assert m.balance == approx(balance_after_buy, 1e-10)
+    assert m.capital == approx(x.buy('cur0', 10).capital, 1e-10)
+
+    # The original instance is not changed.
+    assert x.balance['cur0'] == 0.1
+
+    assert m.sell('cur0', 9) is m
+    assert m.make_portfolio(target_portfolios[0]) is m
+    assert m.portfolio == approx(target_portfolios[0], 1e-10)
+    assert m.next_step() is m
+    assert len(m) == 1
+    with raises(StopIteration):
+        m.next_step()
+
+    frozen = m.freeze()
+    assert type(frozen) is Xchg
+    assert frozen.balance == m.balance
+    m.sell('cur2', 1)
+    assert frozen.balance != m.balance
+
+
+def test_resample():
+    '''Test stepping over coarser candles of the same data.'''
+    # Candles 0-3, 4-7 and 8-9 fall into coarse candles.
+    store = synthetic_candles(10, 2, period=1800, seed=0)
+    rollup = store.rollup(7200)
+    x = Xchg(0.1, 0.01, candles=store)
+
+    # No coarse candle is closed before the fourth candle.
+    for steps in range(1, 3):
+        with raises(ValueError):
+            x.next_step(steps).resample(7200)
+    with raises(ValueError):
+        x.resample(7200)
+
+    # The coarse candle closes with its last candle, so its close price is
+    # the current one, and it stays current until the next one closes.
+    for steps, coarse in [(3, 0), (4, 0), (6, 0), (7, 1), (9, 2)]:
+        y = x.next_step(steps).buy('cur0', 1)
+        r = y.resample(7200)
+        assert r.current_candle == rollup.candle(coarse)
+        assert r.balance == y.balance
+        assert len(r) == 3 - coarse
+        last = [3, 7, 9][coarse]
+        assert last <= steps
+        assert r.current_candle['cur0']['close'] == \
+            store.candle(last)['cur0']['close']
+
+    # A window ends at the last coarse candle which closes inside it.
+    assert len(x.next_step(3).window(0, 5).resample(7200)) == 2
+    assert len(x.next_step(3).window(0, 4).resample(7200)) == 1
+
+
+def test_init_columns(files: dict, tmp_path: str):
+    '''Test loading of selected columns with a given dtype.
+
+    Args:
+        files: A dictionary with csv files content.
+        tmp_path: A path which authomatically created by pytest for testing.
+    '''
+    for filename, content in files.items():
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content)
+    x = Xchg(0.1, 0.01, data_path=tmp_path, columns=[], dtype=np.float32)
+    assert list(x.current_candle['cur0']) == ['date', 'close']
+    x = x.make_portfolio({'cash': 0.5, 'cur0': 0.5, 'cur1': 0, 'cur2': 0})
+    assert x.portfolio['cur0'] == approx(0.5, 1e-6)
+
+
+def test_seek():
+    '''Test navigation by dates and by several steps.'''
+    store = synthetic_candles(10, 2, period=1800, start=0, seed=0)
+    x = Xchg(0.1, 0.01, candles=store)
+    assert x.next_step(3).data_start == 5400
+    assert len(x.next_step(9)) == 1
+    with raises(StopIteration):
+        x.next_step(10)
+    with raises(ValueError):
+        x.next_step(0)
+
+    assert x.seek(3600).data_start == 3600
+    assert x.seek(3601).data_start == 5400
+    assert x.seek(-1).data_start == 0
+    assert x.seek(5400).seek(0).data_start == 5400
+    with raises(StopIteration):
+        x.seek(16201)
+
+    y = x.between(1800, 7200)
+    assert (len(y), y.data_start, y.data_end) == (3, 1800, 5400)
+    assert y.seek(5400).data_start == 5400
+    with raises(StopIteration):
+        y.seek(7200)
+    assert len(x.next_step().between(end=3600)) == 1
+    assert len(x.between(start=16200)) == 1
+
+
+def test_fork(candles: list, balance: dict):
+    '''Test that forks of a mutable instance don't affect each other.
+
+    Args:
+        candles: A candles list.
+        balance: An initial balance.
+    '''
+    m = Xchg(0.1, 0.01, balance=balance, candles=candles).mutable()
+    f = m.fork()
+    assert type(f) is MutableXchg
+    assert f.balance == m.balance
+    f.buy('cur0', 10)
+    assert m.balance == balance
+    m.sell('cur1', 0.3)
+    assert f.balance['cur1'] == balance['cur1']
+    assert f.balance['cur0'] != balance['cur0']
+    f.next_step()
+    assert len(m) == len(f) + 1
+
+    x = Xchg(0.1, 0.01, balance=balance, candles=candles)
+    assert x.fork().balance == x.balance
+
+
+def test_snapshot(candles: list, balance: dict):
+    '''Test that a state survives pickling and restoring.
+
+    Args:
+        candles: A candles list.
+        balance: An initial balance.
+    '''
+    x = Xchg(0.1, 0.01, balance=balance, candles=candles)
+    y = x.buy('cur0', 10).next_step()
+    snapshot = pickle.loads(pickle.dumps(y.snapshot()))
+    z = Xchg(0.2, 0.02, candles=candles).restore(snapshot)
+    assert (z.balance, z.fee, z.min_order_size, z.current_candle) == \
+        (y.balance, y.fee, y.min_order_size, y.current_candle)
+    assert z.mutable().restore(snapshot).balance == y.balance
+    with raises(ValueError):
+        Xchg(0.1, 0.01, candles=synthetic_candles(2, 4)).restore(snapshot)
+
+
+def test_execute(candles: list, balance: dict):
+    '''Test that a batch of orders works like sells and then buys one by
+    one.
+
+    Args:
+        candles: A candles list.
+        balance: An initial balance.
+    '''
+    x = Xchg(0.1, 0.01, balance=balance, candles=candles)
+    orders = [('cur2', 'buy', 2.0),       # Executed.
+              ('cur0', 'buy', 30.0),      # Not enough cash.
+              ('cur1', 'sell', 0.3),      # Executed before buys.
+              ('cur0', 'buy', 0.1),       # Too small.
+              ('cur1', 'sell', 0.3),      # Not enough cur1 after the sell.
+              ('cur0', 'sell', 0.1),      # Too small.
+              ('cur1', 'buy', 1.0)]       # Executed after the other cur1.
+    y, fills = x.execute(orders)
+
+    expected = x
+    for currency, side, amount in sorted(orders, key=lambda o: o[1] != 'sell'):
+        expected = getattr(expected, side)(currency, amount)
+    assert y.balance == approx(expected.balance, 1e-12)
+    assert [fill['status'] for fill in fills] == \
+        ['executed', 'insufficient_balance', 'executed', 'min_order_size',
+         'insufficient_balance', 'min_order_size', 'executed']
+    assert fills[0]['price'] == candles[0]['cur2']['close']
+    assert fills[0]['fee'] == approx(2.0 * candles[0]['cur2']['close'] * 0.1)
+    assert fills[1]['fee'] == 0.0
+
+    # Negative amounts are rejected like in buy and sell.
+    z, fills = x.execute([('cur0', 'buy', -1.0), ('cur1', 'sell', -1.0)])
+    assert z.balance == x.balance
+    assert z.balance == x.buy('cur0', -1.0).sell('cur1', -1.0).balance
+    assert [fill['status'] for fill in fills] == \
+        ['min_order_size', 'min_order_size']
+    assert [fill['fee'] for fill in fills] == [0.0, 0.0]
+
+    z, fills = x.execute([])
+    assert z.balance == x.balance and fills == []
+    with raises(ValueError):
+        x.execute([('cur0', 'hold', 1.0)])
+
+
+def test_missing_candles(gap_files: dict, tmp_path: str):
+    '''Test that orders are rejected at missing candles.
+
+    Args:
+        gap_files: A dictionary with csv files content.
+        tmp_path: A path which authomatically created by pytest for testing.
+    '''
+    for filename, content in gap_files.items():
+        with open(tmp_path / filename, 'w') as f:
+            f.write(content)
+
+    # cur1 has no price before its first candle, but an empty balance of it
+    # is worth nothing.
+    x = Xchg(0.1, 0.01, data_path=tmp_path)
+    assert np.isnan(x._price('cur1'))
+    assert x.capital == 1.0
+    assert x.portfolio['cur1'] == 0.0
+    assert x.buy('cur1', 0.1).balance == x.balance
+    assert x.buy('cur0', 0.1).balance != x.balance
+    x_new, fills = x.execute([('cur1', 'buy', 0.1), ('cur0', 'buy', 0.1)])
+    assert [fill['status'] for fill in fills] == ['missing_candle',
+                                                  'executed']
+    assert x_new.balance == x.buy('cur0', 0.1).balance
+
+    # The rest of the capital is split in proportion to the target.
+    x_new = x.make_portfolio({'cash': 0.2, 'cur0': 0.4, 'cur1': 0.2,
+                              'cur2': 0.2})
+    assert x_new.balance['cur1'] == 0.0
+    assert x_new.portfolio == approx({'cash': 0.25, 'cur0': 0.5, 'cur1': 0.0,
+                                      'cur2': 0.25}, 1e-10)
+    with raises(ValueError):
+        x.backtest(np.tile([1.0, 0.0, 0.0, 0.0], (3, 1)))
+
+    # cur2 has a gap at the second candle, so it's not traded there.
+    x = Xchg(0.1, 0.01, data_path=tmp_path,
+             balance={'cash': 1.0, 'cur2': 1.0}).next_step()
+    assert x.sell('cur2', 0.5).balance == x.balance
+    x_new = x.make_portfolio({'cash': 0.5, 'cur0': 0.5, 'cur1': 0.0,
+                              'cur2': 0.0})
+    assert x_new.balance['cur2'] == 1.0
+    assert x_new.balance['cur0'] > 0.0
+    assert x.next_step().sell('cur2', 0.5).balance['cur2'] == 0.5
+    assert len(x.next_step().backtest([[1.0, 0.0, 0.0, 0.0]])['capital']) \
+        == 1
+
+    # Indicators of cur1 start at its first candle, and a coarse candle
+    # opens at it.
+    x = Xchg(0.1, 0.01, data_path=tmp_path)
+    assert np.isnan(x.feature('ema', span=3)[1])
+    assert x.next_step().feature('ema', span=3)[1] == 6.0
+    assert np.isnan(x.next_step().feature('sma', window=2)[1])
+    assert x.next_step(2).feature('sma', window=2).tolist() == \
+        [3.5, 6.5, 9.5]
+    assert x.next_step(2).resample(7200).current_candle['cur1']['open'] == 5
@@ -0,0 +1,296 @@
+'''Many independent exchanges simulated in lockstep.'''
+
+import numpy as np
+from .candles import Candles
+from .common import _read_candles
+from .engine import _target_amounts
+from .engine import _trade
+from .engine import _values
+
+
+class VecXchg:
+    __slots__ = ('__fee', '__min_order_size', '__candles', '__positions',
+                 '__balances')
+
+    def __init__(self, fee, min_order_size, data_path=None, balance=None,
+                 candles=None, envs=1, positions=None):
+        '''Create K independent exchanges over the same candles. Each of them
+        has its own balance and its own position in the timeline, and all
+        operations are applied to all exchanges at once with array
+        operations.
+
+        Args:
+          fee: What part of a trade volume will be paid as fee.
+          min_order_size: Minimum trade volume expressed in a base currency
+              (cash).
+          data_path: Where csv files with data are stored.
+          balance: An initial balance, the same as in Xchg for all exchanges,
+              or an array with a shape (K, N + 1) where columns are a cash
+              currency followed by currencies.
+          candles: A list of candles or a Candles store, it's used when
+              data_path is not set.
+          envs: A number of exchanges K, it's used when balance is not an
+              array.
+          positions: Indexes of the current candle of each exchange, zero by
+              default.
+        '''
+        self.__fee = fee
+        self.__min_order_size = min_order_size
+
+        if data_path is not None:
+            self.__candles = _read_candles(data_path)
+        elif isinstance(candles, list):
+            self.__candles = Candles.from_list(candles)
+        else:
+            self.__candles = candles
+        currencies = self.__candles.currencies
+
+        if isinstance(balance, np.ndarray) and balance.ndim == 2:
+            self.__balances = balance.astype(np.float64)
+        else:
+            if isinstance(balance, dict):
+                row = [float(balance.get(currency, 0.0))
+                       for currency in ['cash'] + currencies]
+            else:
+                row = [1.0 if balance is None else float(balance)] \
+                    + [0.0] * len(currencies)
+            self.__balances = np.tile(row, (envs, 1))
+
+        positions = 0 if positions is None else positions
+        self.__positions = np.broadcast_to(
+            np.asarray(positions, dtype=np.int64),
+            len(self.__balances)).copy()
+
+    def __len__(self):
+        '''Returns the number of exchanges.'''
+        return len(self.__balances)
+
+    def _replace(self, positions: np.ndarray = None,
+                 balances: np.ndarray = None) -> 'VecXchg':
+        '''Create an instance which shares candles and settings with this
+        one.
+
+        Args:
+            positions: Positions of exchanges, the same by default.
+            balances: Balances of exchanges, the same by default.
+
+        Returns:
+            A new VecXchg instance.
+        '''
+        x = object.__new__(VecXchg)
+        x.__fee = self.__fee
+        x.__min_order_size = self.__min_order_size
+        x.__candles = self.__candles
+        x.__positions = self.__positions if positions is None else positions
+        x.__balances = self.__balances if balances is None else balances
+        return x
+
+    @property
+    def fee(self) -> float:
+        '''Get a fee which is used in exchanges.
+
+        Returns:
+            A fee.
+        '''
+        return self.__fee
+
+    @property
+    def min_order_size(self) -> float:
+        '''Get a minimum order size which is set in exchanges.
+
+        Returns:
+            A minimum order value expressed in a cash currency.
+        '''
+        return self.__min_order_size
+
+    @property
+    def currencies(self) -> list:
+        '''Get currencies which are used in exchanges.
+
+        Returns:
+            List of currencies.
+        '''
+        return self.__candles.currencies
+
+    @property
+    def positions(self) -> np.ndarray:
+        '''Get indexes of the current candle of each exchange.
+
+        Returns:
+            An array with a shape (K,).
+        '''
+        return self.__positions
+
+    @property
+    def balances(self) -> np.ndarray:
+        '''Get balances of all exchanges.
+
+        Returns:
+            An array with a shape (K, N + 1), where columns are a cash currency
+            followed by currencies.
+        '''
+        return self.__balances
+
+    @property
+    def prices(self) -> np.ndarray:
+        '''Get close prices at the current candle of each exchange.
+
+        Returns:
+            An array with a shape (K, N).
+        '''
+        return self.__candles.column('close')[self.__positions]
+
+    @property
+    def capital(self) -> np.ndarray:
+        '''Get a capital of each exchange.
+
+        Returns:
+            An array with a shape (K,).
+        '''
+        return _values(self.__balances, self.prices).sum(axis=1)
+
+    @property
+    def portfolio(self) -> np.ndarray:
+        '''Get a portfolio of each exchange.
+
+        Returns:
+            An array with a shape (K, N + 1).
+        '''
+        values = _values(self.__balances, self.prices)
+        return values / values.sum(axis=1)[:, None]
+
+    @property
+    def missing(self) -> np.ndarray:
+        '''Get which candles of each exchange were missing in the data. Orders
+        at missing candles are not executed.
+
+        Returns:
+            A boolean array with a shape (K, N).
+        '''
+        return np.broadcast_to(self.__candles.missing(self.__positions),
+                               (len(self), len(self.currencies)))
+
+    @property
+    def done(self) -> np.ndarray:
+        '''Get which exchanges are at the last candle.
+
+        Returns:
+            A boolean array with a shape (K,).
+        '''
+        return self.__positions == len(self.__candles) - 1
+
+    def next_step(self) -> 'VecXchg':
+        '''Go to the next step in timeline in all exchanges.
+
+        Returns:
+            A new VecXchg instance.
+        '''
+        if self.done.any():
+            raise StopIteration
+        return self._replace(positions=self.__positions + 1)
+
+    def reset(self, envs: np.ndarray, positions=0,
+              balance=None) -> 'VecXchg':
+        '''Restart some of exchanges.
+
+        Args:
+            envs: A boolean mask or indexes of exchanges to restart.
+            positions: New positions of these exchanges.
+            balance: New balances of these exchanges, an initial balance of
+                Xchg by default.
+
+        Returns:
+            A new VecXchg instance.
+        '''
+        new_positions = self.__positions.copy()
+        new_positions[envs] = positions
+        balances = self.__balances.copy()
+        if balance is None:
+            balances[envs] = 0.0
+            balances[envs, 0] = 1.0
+        else:
+            balances[envs] = balance
+        return self._replace(positions=new_positions, balances=balances)
+
+    def _order(self, currency: str, amount) -> 'VecXchg':
+        '''Place orders for one currency in all exchanges.
+
+        Args:
+            currency: A name of the currency.
+            amount: How much units to receive in each exchange, positive to
+                buy and negative to sell.
+
+        Returns:
+            A new VecXchg instance.
+        '''
+        amounts = np.zeros((len(self), len(self.currencies)))
+        amounts[:, self.__candles.index(currency)] = amount
+        return self.trade(amounts)
+
+    def buy(self, currency: str, amount) -> 'VecXchg':
+        '''Buy currency in all exchanges.
+
+        Args:
+            currency: A name of the currency.
+            amount: How much units of this currency to buy, a number or an
+                array with a shape (K,).
+
+        Returns:
+            A new VecXchg instance after a buy operation.
+        '''
+        # Xchg.buy pays for the amount and receives it without a fee.
+        return self._order(currency, np.asarray(amount) * (1 - self.fee))
+
+    def sell(self, currency: str, amount) -> 'VecXchg':
+        '''Sell currency in all exchanges.
+
+        Args:
+            currency: A name of the currency.
+            amount: How much units of this currency to sell, a number or an
+                array with a shape (K,).
+
+        Returns:
+            A new VecXchg instance after a sell operation.
+        '''
+        return self._order(currency, -np.asarray(amount))
+
+    def trade(self, amounts: np.ndarray) -> 'VecXchg':
+        '''Sell and then buy several currencies in all exchanges, like
+        make_portfolio does.
+
+        Args:
+            amounts: How much units of each currency to receive after trading,
+                an array with a shape (K, N). Negative amounts are sold and
+                positive amounts are bought. Amounts at missing candles are
+                ignored.
+
+        Returns:
+            A new VecXchg instance.
+        '''
+        amounts = np.where(self.missing, 0.0,
+                           np.asarray(amounts, dtype=np.float64))
+        balances = _trade(self.__balances, self.prices, amounts, self.fee,
+                          self.min_order_size)[0]
+        return self._replace(balances=balances)
+
+    def make_portfolio(self, target_portfolio) -> 'VecXchg':
+        '''Make a desired portfolio in all exchanges. Currencies at missing
+        candles keep their balances, like in Xchg.make_portfolio.
+
+        Args:
+            target_portfolio: A desired portfolio with a shape (N + 1,) for all
+                exchanges or (K, N + 1) for each of them, where columns are a
+                cash currency followed by currencies.
+
+        Returns:
+            A new VecXchg instance.
+        '''
+        prices = self.prices
+        target = np.broadcast_to(np.asarray(target_portfolio,
+                                            dtype=np.float64),
+                                 self.__balances.shape)
+        amounts = _target_amounts(self.__balances, prices, target, self.fee,
+                                  self.missing)[0]
+        balances = _trade(self.__balances, prices, amounts, self.fee,
+                          self.min_order_size)[0]
+        return self._replace(balances=balances)
@@ -1,11 +1,37 @@
 '''Simulator of a currency exchange.'''
 
+import numpy as np
+from time import perf_counter
+from . import instrumentation
+from .candles import Candles
 from .common import _read_candles
+from .engine import _backtest
+from .engine import _EXECUTED
+from .engine import _MIN_ORDER_SIZE
+from .engine import _MISSING_CANDLE
+from .engine import _NO_ORDER
+from .engine import _STATUSES
+from .engine import _target_amounts
+from .engine import _trade
+from .engine import _values
+from .ledger import BUY
+from .ledger import Ledger
+from .ledger import SELL
 
 
 class Xchg:
+    # Instances are created on every step and every trade, so they keep only
+    # a few references and no per-instance dictionary.
+    __slots__ = ('__fee', '__min_order_size', '__candles', '__position',
+                 '__end', '__balance', '__balance_dict', '__capital',
+                 '__portfolio', '__ledger', '__shared')
+
+    # Whether operations change this instance instead of creating a new one,
+    # see MutableXchg.
+    _inplace = False
+
     def __init__(self, fee, min_order_size, data_path=None, balance=None,
-                 candles=None):
+                 candles=None, ledger=None, columns=None, dtype=np.float64):
         '''Create an instance of a currency exchange.
 
         Args:
@@ -19,36 +45,49 @@ class Xchg:
               set as the base currency (cash) value. Also you set it as a full
               dictionary with all currencies as keys and values.
           candles: You can directly initialize the class with candles, not to
-              read them from a disk.
+              read them from a disk. It can be a list of candles, a Candles
+              store or a CandleStream.
+          ledger: A Ledger where executed trades of this instance and all
+              instances derived from it are recorded. Trades are not recorded
+              by default.
+          columns: Columns to load from csv files, all by default. The date
+              and close columns are always loaded.
+          dtype: A data type of loaded values, for example np.float32 to
+              halve memory. Dates are always float64.
         '''
         self.__fee = fee
         self.__min_order_size = min_order_size
 
         if data_path is not None:
-            res = _read_candles(data_path)
-            self.__currencies = res['currencies']
-            self.__candles = res['candles']
+            self.__candles = _read_candles(data_path, columns=columns,
+                                           dtype=dtype)
+        elif isinstance(candles, list):
+            self.__candles = Candles.from_list(candles)
         else:
-            self.__currencies = list(sorted(candles[0].keys()))
             self.__candles = candles
-
-        self.__data_start = self.__candles[0][self.__currencies[0]]['date']
-        self.__data_end = self.__candles[-1][self.__currencies[0]]['date']
-
-        if type(balance) == dict:
-            self.__balance = {}
-            for currency in ['cash'] + self.__currencies:
-                self.__balance[currency] = float(balance.get(currency, 0.0))
-        elif balance is None:
-            self.__balance = {}
-            self.__balance['cash'] = 1.0
-            for currency in self.__currencies:
-                self.__balance[currency] = 0.0
+        currencies = self.__candles.currencies
+
+        # Candles are shared between all instances derived from this one,
+        # each instance only keeps its own position in the timeline and the
+        # end of its window, which is exclusive.
+        self.__position = 0
+        self.__end = len(self.__candles)
+
+        # A balance is an array with cash followed by currencies.
+        if isinstance(balance, dict):
+            self.__balance = np.array([float(balance.get(currency, 0.0))
+                                       for currency
+                                       in ['cash'] + currencies])
         else:
-            self.__balance = {}
-            self.__balance['cash'] = float(balance)
-            for currency in self.__currencies:
-                self.__balance[currency] = 0.0
+            self.__balance = np.zeros(len(currencies) + 1)
+            self.__balance[0] = 1.0 if balance is None else float(balance)
+        self.__balance_dict = None
+        self.__capital = None
+        self.__portfolio = None
+        self.__ledger = ledger
+        # Whether the balance array is shared with a fork, so a mutable
+        # instance must copy it before changing.
+        self.__shared = False
 
     def __repr__(self):
         '''Returns class attributes as a string.'''
@@ -65,7 +104,220 @@ class Xchg:
 
     def __len__(self):
         '''Returns the number of candles.'''
-        return len(self.__candles)
+        return self.__end - self.__position
+
+    def _replace(self, position: int = None,
+                 balance: np.ndarray = None) -> 'Xchg':
+        '''Create an instance which shares candles and settings with this
+        one, skipping reading and validation of the data.
+
+        Args:
+            position: An index of the current candle, the same by default.
+            balance: A balance array, it's used as is and must not be changed
+                later. The same by default.
+
+        Returns:
+            A new Xchg instance, or this instance if it's mutable.
+        '''
+        if self._inplace:
+            x = self
+        else:
+            x = object.__new__(type(self))
+            x.__fee = self.__fee
+            x.__min_order_size = self.__min_order_size
+            x.__candles = self.__candles
+            x.__end = self.__end
+            x.__ledger = self.__ledger
+        x.__position = self.__position if position is None else position
+        if balance is None:
+            x.__balance = self.__balance
+            x.__balance_dict = self.__balance_dict
+            x.__shared = self.__shared
+        else:
+            x.__balance = balance
+            x.__balance_dict = None
+            x.__shared = False
+        if position is None and balance is None:
+            x.__capital = self.__capital
+            x.__portfolio = self.__portfolio
+        else:
+            x.__capital = None
+            x.__portfolio = None
+        return x
+
+    def _convert(self, cls: type) -> 'Xchg':
+        '''Copy this instance into an instance of another class with its own
+        balance array.
+
+        Args:
+            cls: Xchg or a subclass of it.
+
+        Returns:
+            A new instance of the class.
+        '''
+        x = object.__new__(cls)
+        x.__fee = self.__fee
+        x.__min_order_size = self.__min_order_size
+        x.__candles = self.__candles
+        x.__position = self.__position
+        x.__end = self.__end
+        x.__ledger = self.__ledger
+        x.__balance = self.__balance.copy()
+        x.__balance_dict = None
+        x.__capital = None
+        x.__portfolio = None
+        x.__shared = False
+        return x
+
+    def fork(self) -> 'Xchg':
+        '''Get an independent copy of this instance for branching, for
+        example in a tree search. It shares candles and the balance array
+        with this instance, and a mutable instance copies the balance only
+        when one of them trades, so a fork costs a few references.
+
+        Returns:
+            A new instance of the same class with the same state.
+        '''
+        if not self._inplace:
+            return self._replace()
+        self.__shared = True
+        x = object.__new__(type(self))
+        x.__fee = self.__fee
+        x.__min_order_size = self.__min_order_size
+        x.__candles = self.__candles
+        x.__position = self.__position
+        x.__end = self.__end
+        x.__ledger = self.__ledger
+        x.__balance = self.__balance
+        x.__balance_dict = self.__balance_dict
+        x.__capital = self.__capital
+        x.__portfolio = self.__portfolio
+        x.__shared = True
+        return x
+
+    def snapshot(self) -> dict:
+        '''Get a state of this instance without candles. It consists of
+        plain Python values, so it can be pickled or saved as JSON and
+        restored in another process which has the same candles.
+
+        Returns:
+            A dictionary with a fee, a minimum order size, currencies, a
+            position and an end of the window, and a balance list where cash
+            is followed by currencies.
+        '''
+        return {'fee': self.__fee,
+                'min_order_size': self.__min_order_size,
+                'currencies': list(self.currencies),
+                'position': self.__position,
+                'end': self.__end,
+                'balance': self.__balance.tolist()}
+
+    def restore(self, snapshot: dict) -> 'Xchg':
+        '''Create an instance from a snapshot over candles of this instance.
+
+        Args:
+            snapshot: A state from the snapshot method.
+
+        Returns:
+            A new instance of the same class with the state of the snapshot.
+        '''
+        if snapshot['currencies'] != self.currencies:
+            raise ValueError('The snapshot was made with other currencies.')
+        if snapshot['end'] > len(self.__candles):
+            raise ValueError('The snapshot was made with more candles.')
+        x = self._convert(type(self))
+        x.__fee = snapshot['fee']
+        x.__min_order_size = snapshot['min_order_size']
+        x.__position = snapshot['position']
+        x.__end = snapshot['end']
+        x.__balance = np.array(snapshot['balance'], dtype=np.float64)
+        return x
+
+    def resample(self, period: int) -> 'Xchg':
+        '''Get an exchange which steps over coarser candles of the same data,
+        see Candles.rollup. Rollups are cached, so switching between
+        resolutions doesn't read or aggregate the data again.
+
+        A coarse candle closes together with its last candle, so the current
+        candle of the new exchange is the last coarse candle which is already
+        closed at the close of the current candle. Trading at it never uses
+        prices from the future.
+
+        Args:
+            period: Period for one candle in seconds, a multiple of the period
+                of the data.
+
+        Returns:
+            A new instance with the same balance.
+        '''
+        if not isinstance(self.__candles, Candles):
+            raise TypeError('Resampling needs candles loaded in memory.')
+        candles = self.__candles.rollup(period)
+        dates = candles.column('date')[:, 0]
+        position = self._closed(self.__position, dates, period)
+        if position < 0:
+            raise ValueError(f"No candle of {period} seconds is closed at "
+                             f"the current candle.")
+        x = self._convert(type(self))
+        x.__candles = candles
+        x.__position = position
+        x.__end = self._closed(self.__end - 1, dates, period) + 1
+        return x
+
+    def _closed(self, position: int, dates: np.ndarray, period: int) -> int:
+        '''Find the last coarse candle which is closed at the close of the
+        given candle.
+
+        Args:
+            position: An index of the candle.
+            dates: Dates of coarse candles.
+            period: Period for one coarse candle in seconds.
+
+        Returns:
+            An index of the coarse candle, or -1 if there is no such candle.
+        '''
+        date = self.__candles.date(position)
+        coarse = int(np.searchsorted(dates, date, 'right')) - 1
+        # The coarse candle which contains the candle is closed only if it's
+        # the last candle of it.
+        if (position + 1 < len(self.__candles)
+                and self.__candles.date(position + 1) // period
+                == date // period):
+            coarse -= 1
+        return coarse
+
+    def mutable(self) -> 'MutableXchg':
+        '''Get a mutable copy of this instance.
+
+        Returns:
+            A MutableXchg instance with the same state.
+        '''
+        return self._convert(MutableXchg)
+
+    def window(self, start: int, end: int = None) -> 'Xchg':
+        '''Get a view of a part of the timeline. It shares candles with this
+        instance and has the same balance, so it's created in a constant time
+        and copies no data.
+
+        Args:
+            start: An index of the first candle of the window, counting from
+                the current candle.
+            end: An index of the candle after the last one of the window,
+                counting from the current candle. The end of the data by
+                default.
+
+        Returns:
+            A new Xchg instance whose timeline is the [start, end) window.
+        '''
+        end = len(self) if end is None else end
+        if not 0 <= start < end <= len(self):
+            raise IndexError(f"A window [{start}, {end}) is out of "
+                             f"{len(self)} candles.")
+        x = self._convert(type(self)) if self._inplace \
+            else self._replace(position=self.__position + start)
+        x.__position = self.__position + start
+        x.__end = self.__position + end
+        return x
 
     @property
     def data_start(self) -> int:
@@ -74,7 +326,7 @@ class Xchg:
         Returns:
             A starting time of the data.
         '''
-        return self.__data_start
+        return self.__candles.date(self.__position)
 
     @property
     def data_end(self) -> int:
@@ -83,7 +335,7 @@ class Xchg:
         Returns:
             An ending time of the data.
         '''
-        return self.__data_end
+        return self.__candles.date(self.__end - 1)
 
     @property
     def current_candle(self) -> dict:
@@ -92,16 +344,28 @@ class Xchg:
         Returns:
             A current candle.
         '''
-        return self.__candles[0]
+        return self.__candles.candle(self.__position)
 
     @property
-    def balance(self) -> float:
+    def balance(self) -> dict:
         '''Get a current balance.
 
         Returns:
             A current balance.
         '''
-        return self.__balance
+        if self.__balance_dict is None:
+            self.__balance_dict = dict(zip(['cash'] + self.currencies,
+                                           self.__balance.tolist()))
+        return self.__balance_dict
+
+    @property
+    def ledger(self) -> Ledger:
+        '''Get a ledger where executed trades are recorded.
+
+        Returns:
+            A Ledger or None if trades are not recorded.
+        '''
+        return self.__ledger
 
     @property
     def fee(self) -> float:
@@ -119,7 +383,7 @@ class Xchg:
         Returns:
             List of currencies.
         '''
-        return self.__currencies
+        return self.__candles.currencies
 
     @property
     def min_order_size(self) -> float:
@@ -138,13 +402,16 @@ class Xchg:
         Returns:
             A capital.
         '''
-        capital = 0
-        for currency, amount in self.balance.items():
-            if currency == 'cash':
-                capital += amount
-            else:
-                capital += amount * self.current_candle[currency]['close']
-        return capital
+        if self.__capital is None:
+            capital = self.__balance[0]
+            for amount, price in zip(self.__balance[1:].tolist(),
+                                     self._prices()):
+                # An empty balance is worth nothing, even if the price is NaN
+                # before the first candle of the currency.
+                if amount:
+                    capital += amount * price
+            self.__capital = float(capital)
+        return self.__capital
 
     @property
     def portfolio(self) -> dict:
@@ -154,27 +421,116 @@ class Xchg:
         Returns:
             A portfolio.
         '''
-        cap = self.capital
-        portf = {}
-        for currency, amount in self.balance.items():
-            if currency == 'cash':
-                portf[currency] = self.balance[currency] / cap
-            else:
-                portf[currency] = (self.balance[currency]
-                                   * self.current_candle[currency]['close']
-                                   / cap)
-        return portf
-
-    def next_step(self) -> 'Xchg':
+        if self.__portfolio is None:
+            cap = self.capital
+            values = _values(self.__balance,
+                             self.__candles.row('close', self.__position))
+            self.__portfolio = dict(zip(['cash'] + self.currencies,
+                                        (values / cap).tolist()))
+        return self.__portfolio
+
+    def feature(self, name: str, **params) -> np.ndarray:
+        '''Get a value of an indicator at the current candle. Indicators are
+        computed once over all candles, see Candles.features, so it's an
+        index operation.
+
+        Args:
+            name: A name of the indicator, for example 'sma'.
+            params: Parameters of the indicator, for example window=20.
+
+        Returns:
+            An array with a value for each currency.
+        '''
+        if not isinstance(self.__candles, Candles):
+            raise TypeError('Features need candles loaded in memory.')
+        return self.__candles.features(name, **params)[self.__position]
+
+    def _prices(self) -> list:
+        '''Get close prices of all currencies at the current candle.
+
+        Returns:
+            A list of prices in the order of currencies.
+        '''
+        return self.__candles.row('close', self.__position).tolist()
+
+    def _price(self, currency: str) -> float:
+        '''Get a close price of the currency at the current candle.
+
+        Args:
+            currency: A name of the currency.
+
+        Returns:
+            A price expressed in a cash currency.
+        '''
+        return self.__candles.row('close', self.__position)[
+            self.__candles.index(currency)].item()
+
+    def next_step(self, steps: int = 1) -> 'Xchg':
         '''Go to the next step in timeline.
 
+        Args:
+            steps: How many candles to skip at once.
+
         Returns:
-            A new Xchg instance with one candle removed.
+            A new Xchg instance with steps candles removed.
         '''
-        if len(self.__candles) == 1:
+        timed = instrumentation.enabled
+        if timed:
+            start = perf_counter()
+        if steps < 1:
+            raise ValueError('A number of steps must be positive.')
+        if steps >= len(self):
             raise StopIteration
-        return Xchg(self.fee, self.min_order_size, balance=self.balance,
-                    candles=self.__candles[1:])
+        x = self._replace(position=self.__position + steps)
+        if timed:
+            instrumentation._time('next_step', perf_counter() - start)
+        return x
+
+    def seek(self, timestamp: float) -> 'Xchg':
+        '''Go forward to the first candle at or after the date with a binary
+        search.
+
+        Args:
+            timestamp: A date (UNIX timestamp).
+
+        Returns:
+            A new Xchg instance whose current candle is the found one.
+        '''
+        position = self._search(timestamp)
+        if position == self.__end:
+            raise StopIteration
+        return self._replace(position=position)
+
+    def between(self, start: float = None, end: float = None) -> 'Xchg':
+        '''Get a view of candles with dates in the [start, end) range, see
+        window.
+
+        Args:
+            start: The first date (UNIX timestamp), the current candle by
+                default.
+            end: The date after the last one, the end of the data by default.
+
+        Returns:
+            A new Xchg instance.
+        '''
+        first = self.__position if start is None else self._search(start)
+        last = self.__end if end is None else self._search(end)
+        return self.window(first - self.__position, last - self.__position)
+
+    def _search(self, timestamp: float) -> int:
+        '''Find the first candle at or after the date, from the current
+        candle to the end of the window.
+
+        Args:
+            timestamp: A date (UNIX timestamp).
+
+        Returns:
+            An index of the candle, or the end of the window if there is no
+            such candle.
+        '''
+        if not isinstance(self.__candles, Candles):
+            raise TypeError('A search needs candles loaded in memory.')
+        return self.__candles.search(timestamp, self.__position, self.__end)
 
     def buy(self, currency: str, amount: float) -> dict:
         '''Buy currency.
@@ -187,23 +543,37 @@ class Xchg:
             A new Xchg instance after a buy operation.
         '''
 
-        balance = self.balance.copy()
-        price = self.current_candle[currency]['close']
+        i = self.__candles.index(currency) + 1
+        if self.__candles.missing(self.__position)[i - 1]:
+            return self._reject(currency, 'buy', amount)
+        price = self._price(currency)
         currency_delta = amount * (1 - self.fee)
         cash_delta = price * amount
 
         # If we want to buy a slightly more than we have, we will forgive.
-        if (cash_delta <= (self.balance['cash'] + 1e-10)
+        if (cash_delta <= (self.__balance[0] + 1e-10)
                 and cash_delta >= self.min_order_size):
-            balance['cash'] -= cash_delta
-            balance[currency] += currency_delta
-            if balance['cash'] < 0.0:
+            balance = self.__balance if self._inplace and not self.__shared \
+                else self.__balance.copy()
+            balance[0] -= cash_delta
+            balance[i] += currency_delta
+            if balance[0] < 0.0:
                 # Set the balance to zero if we bought a slightly more than we
                 # have.
-                balance['cash'] = 0.0
-
-        return Xchg(self.fee, self.min_order_size, balance=balance,
-                    candles=self.__candles)
+                balance[0] = 0.0
+            if self.__ledger is not None:
+                self.__ledger.append(self.__position, i - 1, BUY, amount,
+                                     price, cash_delta * self.fee)
+            if instrumentation.enabled:
+                instrumentation._order(currency, 'buy', amount, 'executed')
+            return self._replace(balance=balance)
+
+        if instrumentation.enabled:
+            instrumentation._order(currency, 'buy', amount,
+                                   'min_order_size'
+                                   if cash_delta < self.min_order_size
+                                   else 'insufficient_balance')
+        return self._replace()
 
     def sell(self, currency: str, amount: float) -> dict:
         '''Sell currency.
@@ -216,68 +586,242 @@ class Xchg:
             A new Xchg instance after a sell operation.
         '''
 
-        balance = self.balance.copy()
-        price = self.current_candle[currency]['close']
+        i = self.__candles.index(currency) + 1
+        if self.__candles.missing(self.__position)[i - 1]:
+            return self._reject(currency, 'sell', amount)
+        price = self._price(currency)
         without_fee = price * amount
         with_fee = without_fee * (1 - self.fee)
 
         # If we want to sell a slightly more than we have, we will forgive.
-        if (amount <= (self.balance[currency] + 1e-10)
+        if (amount <= (self.__balance[i] + 1e-10)
                 and without_fee >= self.min_order_size):
-            balance['cash'] += with_fee
-            balance[currency] -= amount
-            if balance[currency] < 0.0:
+            balance = self.__balance if self._inplace and not self.__shared \
+                else self.__balance.copy()
+            balance[0] += with_fee
+            balance[i] -= amount
+            if balance[i] < 0.0:
                 # Set the balance to zero if we bought a slightly more than we
                 # have.
-                balance[currency] = 0.0
+                balance[i] = 0.0
+            if self.__ledger is not None:
+                self.__ledger.append(self.__position, i - 1, SELL, amount,
+                                     price, without_fee * self.fee)
+            if instrumentation.enabled:
+                instrumentation._order(currency, 'sell', amount, 'executed')
+            return self._replace(balance=balance)
+
+        if instrumentation.enabled:
+            instrumentation._order(currency, 'sell', amount,
+                                   'insufficient_balance'
+                                   if amount > self.__balance[i] + 1e-10
+                                   else 'min_order_size')
+        return self._replace()
+
+    def _reject(self, currency: str, side: str, amount: float) -> 'Xchg':
+        '''Reject an order at a missing candle of the currency, where there
+        was no trading.
 
-        return Xchg(self.fee, self.min_order_size, balance=balance,
-                    candles=self.__candles)
+        Args:
+            currency: A name of the currency.
+            side: 'buy' or 'sell'.
+            amount: How much units of the currency were requested.
 
-    def make_portfolio(self, target_portfolio: dict) -> dict:
-        '''Make a desired portfolio.
+        Returns:
+            A new Xchg instance with the same balance.
+        '''
+        if instrumentation.enabled:
+            instrumentation._order(currency, side, amount, 'missing_candle')
+        return self._replace()
+
+    def execute(self, orders: list) -> tuple:
+        '''Execute a batch of orders with array operations, with the same
+        checks and results as calling sell for all sell orders and then buy
+        for all buy orders, each in the given order.
 
         Args:
-            target_portfolio: A desired portfolio.
+            orders: A list of tuples (currency, side, amount), where side is
+                'buy' or 'sell' and amount is how much units of the currency
+                to buy or sell, like in buy and sell.
 
         Returns:
-            A new Xchg instance with a desired portfolio distribution.
+            A tuple with a new Xchg instance after trading and a list of
+            fills, one for each order. A fill is a dictionary with a currency,
+            a side, an amount, a price, a paid fee expressed in a cash
+            currency and a status: 'executed', 'min_order_size',
+            'insufficient_balance' or 'missing_candle'.
         '''
+        if any(side not in ('buy', 'sell') for _, side, _ in orders):
+            raise ValueError("A side of an order must be 'buy' or 'sell'.")
+        prices = self.__candles.row('close', self.__position)
+        balance = self.__balance.copy()
+        columns = np.array([self.__candles.index(currency)
+                            for currency, _, _ in orders], dtype=np.int64)
+        sold = np.array([side == 'sell' for _, side, _ in orders], dtype=bool)
+        amounts = np.array([amount for _, _, amount in orders],
+                           dtype=np.float64)
+        status = np.full(len(orders), _MIN_ORDER_SIZE)
+        missing = self.__candles.missing(self.__position)[columns]
+        status[missing & (amounts >= 0)] = _MISSING_CANDLE
+
+        # Orders are split into segments without repeated currencies, and
+        # each segment is traded at once with its currencies in the order of
+        # orders, so cash runs out in the same order as with sequential calls.
+        # Orders with a negative amount are rejected as buy and sell do,
+        # instead of being traded to the other side.
+        segments = [[]]
+        for j in sorted(np.flatnonzero((amounts >= 0) & ~missing).tolist(),
+                        key=lambda j: not sold[j]):
+            if columns[j] in columns[segments[-1]]:
+                segments.append([])
+            segments[-1].append(j)
+        for segment in segments:
+            if not segment:
+                continue
+            items = np.concatenate(([0], columns[segment] + 1))
+            received = np.where(sold[segment], -amounts[segment],
+                                amounts[segment] * (1 - self.fee))
+            balance[items], status[segment] = _trade(
+                balance[items], prices[columns[segment]], received, self.fee,
+                self.min_order_size)
+
+        status[status == _NO_ORDER] = _MIN_ORDER_SIZE
+        executed = status == _EXECUTED
+        fees = np.where(executed, prices[columns] * amounts * self.fee, 0.0)
+        x = self._replace(balance=balance) if executed.any() \
+            else self._replace()
+        if self.__ledger is not None:
+            self.__ledger.extend(self.__position, columns[executed],
+                                 np.where(sold[executed], SELL, BUY),
+                                 amounts[executed], prices[columns[executed]],
+                                 fees[executed])
+
+        fills = []
+        for j, (currency, side, amount) in enumerate(orders):
+            fills.append({'currency': currency,
+                          'side': side,
+                          'amount': amount,
+                          'price': prices[columns[j]].item(),
+                          'fee': fees[j].item(),
+                          'status': _STATUSES[status[j]]})
+            if instrumentation.enabled:
+                instrumentation._order(currency, side, amount,
+                                       _STATUSES[status[j]])
+        return x, fills
+
+    def make_portfolio(self, target_portfolio: dict,
+                       info: bool = False) -> 'Xchg':
+        '''Make a desired portfolio.
 
-        x = self
-
-        # Calculate a capital change after trading.
-        cc0 = 1
-        cc1 = 1 - 2 * x.fee + x.fee ** 2
-        while abs(cc1 - cc0) > 1e-10:
-            cc0 = cc1
+        Currencies at missing candles can't be traded, so they keep their
+        balances, and the rest of the capital is split in proportion to the
+        target portfolio.
 
-            # How much we will get from selling.
-            sell_amount = 0
-            for cur in x.currencies:
-                amount = x.portfolio[cur] - cc1 * target_portfolio[cur]
-                if amount > 0:
-                    sell_amount += amount
+        Args:
+            target_portfolio: A desired portfolio.
+            info: Whether to return information about the solver.
 
-            cc1 = (1 - x.fee * x.portfolio['cash'] - (2 * x.fee - x.fee ** 2)
-                   * sell_amount) \
-                / (1 - x.fee * target_portfolio['cash'])
+        Returns:
+            A new Xchg instance with a desired portfolio distribution. If info
+            is True, then a tuple with the instance and a dictionary with a
+            number of solver iterations and a final residual.
+        '''
+        timed = instrumentation.enabled
+        if timed:
+            start = perf_counter()
+        prices = self.__candles.row('close', self.__position)
+        balance = self.__balance
+        target = np.array([target_portfolio['cash']]
+                          + [target_portfolio[cur] for cur in self.currencies],
+                          dtype=np.float64)
+
+        # Calculate amounts after a capital change, then sell first and buy.
+        amount, iterations, residual = _target_amounts(
+            balance[None], prices[None], target[None], self.fee,
+            self.__candles.missing(self.__position)[None])
+        amount = amount[0]
+        balance, status = _trade(balance, prices, amount, self.fee,
+                                 self.min_order_size)
+        if self.__ledger is not None:
+            executed = np.flatnonzero(status == _EXECUTED)
+            sold = amount[executed] < 0
+            # Units before the fee, which is paid from a bought amount.
+            units = np.where(sold, -amount[executed],
+                             amount[executed] / (1 - self.fee))
+            self.__ledger.extend(self.__position, executed,
+                                 np.where(sold, SELL, BUY), units,
+                                 prices[executed],
+                                 units * prices[executed] * self.fee)
+        x = self._replace(balance=balance)
+
+        if timed:
+            for j in np.flatnonzero(status):
+                instrumentation._order(
+                    self.currencies[j], 'sell' if amount[j] < 0 else 'buy',
+                    abs(amount[j].item()), _STATUSES[status[j]])
+            instrumentation._count('rebalances')
+            instrumentation._count('solver_iterations', iterations)
+            instrumentation._time('make_portfolio', perf_counter() - start,
+                                  iterations=iterations,
+                                  residual=residual[0].item())
+        if info:
+            return x, {'iterations': iterations,
+                       'residual': residual[0].item()}
+        return x
 
-        # A capital after trade.
-        tar_capital = x.capital * cc1
+    def backtest(self, weights: np.ndarray) -> dict:
+        '''Make a desired portfolio at each of the following steps, like
+        calling make_portfolio and next_step in a loop, but with array
+        operations over the whole run.
 
-        # Sell first.
-        for cur in x.currencies:
-            amount = tar_capital * target_portfolio[cur] \
-                     / x.current_candle[cur]['close'] - x.balance[cur]
-            if amount < 0:
-                x = x.sell(cur, abs(amount))
+        Args:
+            weights: Desired portfolios with a shape (T, N + 1), where T is a
+                number of steps and columns are a cash currency followed by
+                currencies in the order of the currencies property.
 
-        # Then buy.
-        for cur in x.currencies:
-            amount = tar_capital * target_portfolio[cur] \
-                     / x.current_candle[cur]['close'] - x.balance[cur]
-            if amount > 0:
-                x = x.buy(cur, abs(amount / (1 - self.fee)))
+        Returns:
+            A dictionary with a balance, a capital and a portfolio after
+            trading at each step. Balances and portfolios are arrays with a
+            shape (T, N + 1), capitals are an array with a shape (T,).
+        '''
+        if not isinstance(self.__candles, Candles):
+            raise TypeError('A backtest needs candles loaded in memory.')
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(weights) > len(self):
+            raise ValueError(f"There are only {len(self)} candles left, but "
+                             f"{len(weights)} portfolios are given.")
+        if self.__candles.missing(
+                slice(self.__position, self.__position + len(weights))).any():
+            raise ValueError('A backtest can not trade at missing candles, '
+                             'use make_portfolio and next_step instead.')
+
+        close = self.__candles.column('close')[
+            self.__position:self.__position + len(weights)]
+        balances = _backtest(close, self.__balance, weights, self.fee,
+                             self.min_order_size)
+
+        values = balances.copy()
+        values[:, 1:] *= close
+        capital = values.sum(axis=1)
+        return {'balance': balances,
+                'capital': capital,
+                'portfolio': values / capital[:, None]}
+
+
+class MutableXchg(Xchg):
+    '''A currency exchange whose buy, sell, make_portfolio and next_step
+    change the instance in place and return it, instead of creating a new
+    instance. It's useful in hot loops, for example in reinforcement learning,
+    where the previous states are not needed. The code written for Xchg, like
+    x = x.buy(...), works with it without changes.
+    '''
+    __slots__ = ()
+    _inplace = True
+
+    def freeze(self) -> Xchg:
+        '''Get an immutable copy of this instance.
 
-        return x
+        Returns:
+            A Xchg instance with the same state.
+        '''
+        return self._convert(Xchg)